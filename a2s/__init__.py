@@ -1,5 +1,63 @@
+import importlib
+import sys
+import types
+
 from a2s.exceptions import BrokenMessageError, BufferExhaustedError
 
-from a2s.info import info, ainfo, SourceInfo, GoldSrcInfo
-from a2s.players import players, aplayers, Player
-from a2s.rules import rules, arules
+
+
+# Everything else is imported on first access to keep `import a2s` fast
+LAZY_ATTRIBUTES = {
+    "info": "a2s.info",
+    "ainfo": "a2s.info",
+    "SourceInfo": "a2s.info",
+    "GoldSrcInfo": "a2s.info",
+    "players": "a2s.players",
+    "aplayers": "a2s.players",
+    "aplayers_iter": "a2s.players",
+    "Player": "a2s.players",
+    "rules": "a2s.rules",
+    "arules": "a2s.rules",
+    "arules_iter": "a2s.rules",
+    "LazyRules": "a2s.rules",
+    "probe": "a2s.probe",
+    "aprobe": "a2s.probe",
+    "probe_many": "a2s.probe",
+    "aprobe_many": "a2s.probe",
+    "ProbeResult": "a2s.probe",
+    "A2SSharedSocket": "a2s.a2s_async",
+    "A2SExecutor": "a2s.executor",
+    "A2SScheduler": "a2s.scheduler",
+    "ScheduleEntry": "a2s.scheduler",
+    "ScheduleResult": "a2s.scheduler",
+    "A2SStoreWriter": "a2s.store",
+    "A2SStoreReader": "a2s.store",
+    "StoredResult": "a2s.store",
+    "A2SAddressSet": "a2s.addresses",
+}
+
+__all__ = ["BrokenMessageError", "BufferExhaustedError", *LAZY_ATTRIBUTES]
+
+
+def __getattr__(name):
+    module_name = LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError("module 'a2s' has no attribute " + repr(name))
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_ATTRIBUTES))
+
+
+class LazyModule(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a2s.info binds the submodule to a2s.info, which would
+        # hide the info function of the same name
+        if (isinstance(value, types.ModuleType)
+                and LAZY_ATTRIBUTES.get(name) == value.__name__):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = LazyModule
@@ -0,0 +1,7 @@
+import sys
+
+from a2s.cli import main
+
+
+
+sys.exit(main())
@@ -1,12 +1,19 @@
 import asyncio
+import collections
 import logging
+import socket
 import time
 import io
 
-from a2s.exceptions import BrokenMessageError
-from a2s.a2s_fragment import decode_fragment
-from a2s.defaults import DEFAULT_RETRIES
+from a2s.exceptions import BrokenMessageError, BufferExhaustedError
+from a2s.a2s_fragment import FragmentBuffer
+from a2s.a2s_socket import (
+    SocketStats, ANCDATA_SIZE, set_buffer_sizes, enable_drop_counter,
+    parse_drop_counter)
+from a2s.defaults import DEFAULT_RETRIES, DEFAULT_SHARED_RCVBUF
 from a2s.byteio import ByteReader
+from a2s.encoding import resolve_encoding
+from a2s.profiling import stage
 
 
 
@@ -14,16 +21,30 @@ HEADER_SIMPLE = b"\xFF\xFF\xFF\xFF"
 HEADER_MULTI = b"\xFE\xFF\xFF\xFF"
 A2S_CHALLENGE_RESPONSE = 0x41
 
+PACER_INTERVAL = 0.1
+PACER_MIN_RATE = 100
+
 logger = logging.getLogger("a2s")
 
 
 async def request_async(address, timeout, encoding, a2s_proto):
     conn = await A2SStreamAsync.create(address, timeout)
+    encoding = resolve_encoding(encoding, address)
     response = await request_async_impl(conn, encoding, a2s_proto)
     conn.close()
     return response
 
+async def request_shared(shared, address, timeout, encoding, a2s_proto):
+    conn = await A2SStreamShared.create(shared, address, timeout)
+    encoding = resolve_encoding(encoding, address)
+    try:
+        return await request_async_impl(conn, encoding, a2s_proto)
+    finally:
+        conn.close()
+
 async def request_async_impl(conn, encoding, a2s_proto, challenge=0, retries=0, ping=None):
+    # Paced before taking the time so the wait doesn't count towards the ping
+    await conn.pace()
     send_time = time.monotonic()
     resp_data = await conn.request(a2s_proto.serialize_request(challenge))
     recv_time = time.monotonic()
@@ -47,7 +68,65 @@ async def request_async_impl(conn, encoding, a2s_proto, challenge=0, retries=0,
         raise BrokenMessageError(
             "Invalid response type: " + hex(response_type))
 
-    return a2s_proto.deserialize_response(reader, response_type, ping)
+    with stage("parse"):
+        return a2s_proto.deserialize_response(reader, response_type, ping)
+
+
+async def request_async_iter(address, timeout, encoding, a2s_proto):
+    conn = await A2SStreamAsync.create(address, timeout)
+    conn.protocol.incremental = True
+    encoding = resolve_encoding(encoding, address)
+    try:
+        async for entry in request_async_iter_impl(conn, encoding, a2s_proto):
+            yield entry
+    finally:
+        conn.close()
+
+async def request_async_iter_impl(conn, encoding, a2s_proto):
+    challenge = 0
+    for retries in range(DEFAULT_RETRIES + 1):
+        await conn.pace()
+        chunk, last = await conn.request(a2s_proto.serialize_request(challenge))
+        reader = ByteReader(io.BytesIO(chunk), endian="<", encoding=encoding)
+        response_type = reader.read_uint8()
+        if response_type != A2S_CHALLENGE_RESPONSE:
+            break
+        challenge = reader.read_uint32()
+    else:
+        raise BrokenMessageError(
+            "Server keeps sending challenge responses")
+
+    if not a2s_proto.validate_response_type(response_type):
+        raise BrokenMessageError(
+            "Invalid response type: " + hex(response_type))
+
+    # Parse as many entries as the fragments received so far contain, an
+    # entry cut off at the end is parsed again once the next one arrives
+    entry_count = None
+    while True:
+        stream = reader.stream
+        entry_start = stream.tell()
+        try:
+            if entry_count is None:
+                with stage("parse"):
+                    entry_count = a2s_proto.deserialize_count(reader)
+            while entry_count > 0:
+                entry_start = stream.tell()
+                with stage("parse"):
+                    entry = a2s_proto.deserialize_entry(reader)
+                entry_count -= 1
+                yield entry
+        except BufferExhaustedError:
+            if last:
+                raise
+            stream.seek(entry_start)
+        else:
+            return
+
+        leftover = stream.read()
+        chunk, last = await conn.recv()
+        reader = ByteReader(
+            io.BytesIO(leftover + chunk), endian="<", encoding=encoding)
 
 
 class A2SProtocol(asyncio.DatagramProtocol):
@@ -55,36 +134,67 @@ class A2SProtocol(asyncio.DatagramProtocol):
         self.recv_queue = asyncio.Queue()
         self.error_event = asyncio.Event()
         self.error = None
-        self.fragment_buf = []
+        self.fragment_buf = None
+        # Queue (payload, is_last) for every fragment instead of reassembling
+        self.incremental = False
+        self.next_fragment = 0
+        self.pending_fragments = {}
 
     def connection_made(self, transport):
         self.transport = transport
 
     def datagram_received(self, packet, addr):
+        with stage("read"):
+            self.handle_packet(packet, addr)
+
+    def handle_packet(self, packet, addr):
         header = packet[:4]
         payload = packet[4:]
         if header == HEADER_SIMPLE:
             logger.debug("Received single packet: %r", payload)
-            self.recv_queue.put_nowait(payload)
+            if self.incremental:
+                self.recv_queue.put_nowait((payload, True))
+            else:
+                self.recv_queue.put_nowait(payload)
         elif header == HEADER_MULTI:
-            self.fragment_buf.append(decode_fragment(payload))
-            if len(self.fragment_buf) < self.fragment_buf[0].fragment_count:
+            if self.fragment_buf is None:
+                self.fragment_buf = FragmentBuffer(addr)
+            fragments = self.fragment_buf.add(payload)
+            if self.incremental:
+                for fragment in fragments:
+                    self.queue_fragment(fragment)
+                if self.fragment_buf.complete:
+                    self.fragment_buf = None
+                return
+            if not self.fragment_buf.complete:
                 return # Wait for more packets to arrive
-            self.fragment_buf.sort(key=lambda f: f.fragment_id)
-            reassembled = b"".join(
-                fragment.payload for fragment in self.fragment_buf)
-            # Sometimes there's an additional header present
-            if reassembled.startswith(b"\xFF\xFF\xFF\xFF"):
-                reassembled = reassembled[4:]
+            reassembled = self.fragment_buf.reassemble()
             logger.debug("Received %s part packet with content: %r",
-                len(self.fragment_buf), reassembled)
+                len(self.fragment_buf.fragments), reassembled)
             self.recv_queue.put_nowait(reassembled)
-            self.fragment_buf = []
+            self.fragment_buf = None
         else:
             self.error = BrokenMessageError(
                 "Invalid packet header: " + repr(header))
             self.error_event.set()
 
+    def queue_fragment(self, fragment):
+        # Fragments are passed on as soon as all earlier ones are there
+        self.pending_fragments[fragment.fragment_id] = fragment.payload
+        while self.next_fragment in self.pending_fragments:
+            chunk = self.pending_fragments.pop(self.next_fragment)
+            # Sometimes there's an additional header present
+            if self.next_fragment == 0 and chunk.startswith(HEADER_SIMPLE):
+                chunk = chunk[4:]
+            self.next_fragment += 1
+            last = self.next_fragment >= fragment.fragment_count
+            logger.debug("Received part %s of %s with content: %r",
+                self.next_fragment, fragment.fragment_count, chunk)
+            self.recv_queue.put_nowait((chunk, last))
+            if last:
+                self.next_fragment = 0
+                self.pending_fragments = {}
+
     def error_received(self, exc):
         self.error = exc
         self.error_event.set()
@@ -105,10 +215,11 @@ class A2SStreamAsync:
         self.close()
 
     @classmethod
-    async def create(cls, address, timeout):
+    async def create(cls, address, timeout, rcvbuf=None, sndbuf=None):
         loop = asyncio.get_running_loop()
         transport, protocol = await loop.create_datagram_endpoint(
             lambda: A2SProtocol(), remote_addr=address)
+        set_buffer_sizes(transport.get_extra_info("socket"), rcvbuf, sndbuf)
         return cls(transport, protocol, timeout)
 
     def send(self, payload):
@@ -119,10 +230,13 @@ class A2SStreamAsync:
     async def recv(self):
         queue_task = asyncio.create_task(self.protocol.recv_queue.get())
         error_task = asyncio.create_task(self.protocol.error_event.wait())
-        done, pending = await asyncio.wait({queue_task, error_task},
-                     timeout=self.timeout, return_when=asyncio.FIRST_COMPLETED)
-
-        for task in pending: task.cancel()
+        try:
+            done, pending = await asyncio.wait({queue_task, error_task},
+                         timeout=self.timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Also runs when recv itself gets cancelled
+            queue_task.cancel()
+            error_task.cancel()
         if error_task in done:
            self.protocol.raise_on_error()
         if not done:
@@ -130,9 +244,258 @@ class A2SStreamAsync:
 
         return queue_task.result()
 
+    async def pace(self):
+        pass
+
     async def request(self, payload):
         self.send(payload)
         return await self.recv()
 
     def close(self):
         self.transport.close()
+
+class A2SStreamShared(A2SStreamAsync):
+    def __init__(self, shared, addr, protocol, timeout):
+        super().__init__(shared.transport, protocol, timeout)
+        self.shared = shared
+        self.addr = addr
+
+    @classmethod
+    async def create(cls, shared, address, timeout):
+        protocol = A2SProtocol()
+        addr = await shared.register(address, protocol)
+        return cls(shared, addr, protocol, timeout)
+
+    async def pace(self):
+        await self.shared.pace()
+
+    def send(self, payload):
+        self.shared.sendto(payload, self.addr)
+
+    def close(self):
+        self.shared.unregister(self.addr, self.protocol)
+
+
+async def resolve_address(address):
+    host, port = address
+    try:
+        socket.inet_pton(socket.AF_INET, host)
+        return (host, port)
+    except OSError:
+        pass
+    loop = asyncio.get_running_loop()
+    addrinfo = await loop.getaddrinfo(
+        host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    return addrinfo[0][4]
+
+async def run_bulk(items, concurrency, func):
+    items = list(items)
+    results = [None] * len(items)
+    pending = iter(range(len(items)))
+
+    async def worker():
+        for index in pending:
+            results[index] = await func(items[index])
+
+    await asyncio.gather(
+        *(worker() for worker_num in range(min(concurrency, len(items)))))
+    return results
+
+
+class SendPacer:
+    """Additive increase, multiplicative decrease send rate limiter driven by
+    the kernel drop counter. Unlimited until the first drop is seen, unless
+    max_rate is set."""
+
+    def __init__(self, max_rate=None):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.next_send = 0.0
+        self.drops = 0
+        self.window_start = time.monotonic()
+        self.window_sends = 0
+        self.last_decrease = 0.0
+
+    def limit(self, max_rate):
+        """Lowers max_rate, a higher value than the current one is ignored"""
+        if self.max_rate is None or max_rate < self.max_rate:
+            self.max_rate = max_rate
+        if self.rate is None or self.rate > self.max_rate:
+            self.rate = self.max_rate
+
+    def sent(self):
+        self.window_sends += 1
+
+    async def wait(self):
+        if self.rate is None:
+            return
+        now = time.monotonic()
+        send_time = max(now, self.next_send)
+        self.next_send = send_time + 1 / self.rate
+        if send_time > now:
+            await asyncio.sleep(send_time - now)
+
+    def update(self, drops):
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if drops is not None and drops > self.drops:
+            self.drops = drops
+            # A single burst bumps the counter on many packets, only react once
+            if now - self.last_decrease >= PACER_INTERVAL:
+                sent_rate = self.window_sends / max(elapsed, PACER_INTERVAL)
+                if self.rate is not None:
+                    sent_rate = min(sent_rate, self.rate)
+                self.rate = max(PACER_MIN_RATE, sent_rate / 2)
+                self.last_decrease = now
+        elif elapsed >= PACER_INTERVAL and self.rate is not None:
+            self.rate += PACER_MIN_RATE
+            if self.max_rate is not None:
+                self.rate = min(self.rate, self.max_rate)
+
+        if elapsed >= PACER_INTERVAL:
+            self.window_start = now
+            self.window_sends = 0
+
+
+class A2SSharedProtocol(asyncio.DatagramProtocol):
+    # Only used on event loops that can't watch sockets directly
+    def __init__(self, shared):
+        self.shared = shared
+
+    def datagram_received(self, packet, addr):
+        self.shared.stats.read_passes += 1
+        self.shared.dispatch(packet, addr)
+
+    def error_received(self, exc):
+        self.shared.error_received(exc)
+
+class A2SSharedSocket:
+    def __init__(self, loop, sock, max_rate=None):
+        self.loop = loop
+        self.sock = sock
+        self.transport = None
+        self.routes = {}
+        self.released = {}
+        self.send_queue = collections.deque()
+        self.stats = SocketStats()
+        self.pacer = SendPacer(max_rate)
+        self.closed = False
+
+    def __del__(self):
+        self.close()
+
+    @classmethod
+    async def create(cls, rcvbuf=DEFAULT_SHARED_RCVBUF, sndbuf=None, max_rate=None):
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        set_buffer_sizes(sock, rcvbuf, sndbuf)
+        sock.bind(("0.0.0.0", 0))
+        shared = cls(loop, sock, max_rate)
+        if enable_drop_counter(sock):
+            shared.stats.kernel_drops = 0
+        try:
+            loop.add_reader(sock.fileno(), shared.read_ready)
+        except NotImplementedError:
+            # Proactor loops can't watch sockets, let a transport do the IO
+            shared.transport, protocol = await loop.create_datagram_endpoint(
+                lambda: A2SSharedProtocol(shared), sock=sock)
+        return shared
+
+    def read_ready(self):
+        # Drain everything that arrived in a burst before going back to the
+        # event loop, every pass through the selector costs a syscall
+        self.stats.read_passes += 1
+        while True:
+            try:
+                if ANCDATA_SIZE:
+                    packet, ancdata, flags, addr = self.sock.recvmsg(
+                        65535, ANCDATA_SIZE)
+                    drops = parse_drop_counter(ancdata)
+                    if drops is not None:
+                        self.stats.kernel_drops = drops
+                else:
+                    packet, addr = self.sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as exc:
+                self.error_received(exc)
+                break
+            self.dispatch(packet, addr)
+        self.pacer.update(self.stats.kernel_drops)
+
+    def dispatch(self, packet, addr):
+        self.stats.packets_received += 1
+        self.stats.bytes_received += len(packet)
+        protocol = self.routes.get(addr)
+        if protocol is None:
+            logger.debug("Dropping packet from unknown address %r", addr)
+            return
+        protocol.datagram_received(packet, addr)
+
+    def error_received(self, exc):
+        # Errors can't be attributed to a destination on an unconnected socket
+        logger.debug("Error on shared socket: %r", exc)
+
+    async def register(self, address, protocol):
+        addr = await resolve_address(address)
+        # Replies can only be told apart by their source address, so there
+        # can only be one request in flight per destination
+        while addr in self.routes:
+            await self.released.setdefault(addr, asyncio.Event()).wait()
+        self.routes[addr] = protocol
+        return addr
+
+    def unregister(self, addr, protocol):
+        if self.routes.get(addr) is not protocol:
+            return
+        del self.routes[addr]
+        released = self.released.pop(addr, None)
+        if released is not None:
+            released.set()
+
+    async def pace(self):
+        await self.pacer.wait()
+
+    def sendto(self, payload, addr):
+        logger.debug("Sending packet to %r: %r", addr, payload)
+        packet = HEADER_SIMPLE + payload
+        self.stats.packets_sent += 1
+        self.pacer.sent()
+        if self.transport is not None:
+            self.transport.sendto(packet, addr)
+            return
+        if not self.send_queue:
+            try:
+                self.sock.sendto(packet, addr)
+                return
+            except (BlockingIOError, InterruptedError):
+                self.loop.add_writer(self.sock.fileno(), self.write_ready)
+            except OSError as exc:
+                self.error_received(exc)
+                return
+        self.send_queue.append((packet, addr))
+
+    def write_ready(self):
+        while self.send_queue:
+            packet, addr = self.send_queue[0]
+            try:
+                self.sock.sendto(packet, addr)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as exc:
+                self.error_received(exc)
+            self.send_queue.popleft()
+        self.loop.remove_writer(self.sock.fileno())
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.transport is not None:
+            self.transport.close()
+            return
+        if not self.loop.is_closed():
+            self.loop.remove_reader(self.sock.fileno())
+            self.loop.remove_writer(self.sock.fileno())
+        self.sock.close()
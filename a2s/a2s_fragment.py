@@ -2,9 +2,24 @@ import bz2
 import io
 
 from a2s.byteio import ByteReader
+from a2s.cache import AddressCache
+from a2s.defaults import DEFAULT_CACHE_SIZE
+from a2s.profiling import stage
 
 
 
+HEADER_SIMPLE = b"\xFF\xFF\xFF\xFF"
+
+# Source: uint32 id, uint8 count, uint8 index, uint16 mtu
+# GoldSrc: uint32 id, uint8 with the index in the upper and the count in the
+# lower nibble, no mtu
+FORMAT_SOURCE = "source"
+FORMAT_GOLDSRC = "goldsrc"
+
+# Split format of every server that sent a split response
+fragment_formats = AddressCache(DEFAULT_CACHE_SIZE)
+
+
 class A2SFragment:
     def __init__(self, message_id, fragment_count, fragment_id, mtu,
                  decompressed_size=0, crc=0, payload=b""):
@@ -20,7 +35,35 @@ class A2SFragment:
     def is_compressed(self):
         return bool(self.message_id & (1 << 15))
 
-def decode_fragment(data):
+# GoldSrc can't split into more, so more undetected fragments are Source
+MAX_GOLDSRC_FRAGMENTS = 15
+
+def detect_fragment_format(data):
+    # The first fragment starts with the header of the reassembled packet,
+    # which lands at a different offset in each format, or with the bzip2
+    # magic after the size and checksum if it's compressed
+    if data[5:9] == HEADER_SIMPLE:
+        return FORMAT_GOLDSRC
+    if data[8:12] == HEADER_SIMPLE or data[16:19] == b"BZh":
+        return FORMAT_SOURCE
+    if len(data) < 5:
+        return FORMAT_SOURCE
+    # The header is optional in Source, but the first GoldSrc fragment always
+    # has it. Without it, a packet that would be the first GoldSrc fragment
+    # or isn't a valid one is Source. Later fragments can't be told apart.
+    fragment_id = data[4] >> 4
+    fragment_count = data[4] & 0x0F
+    if fragment_id == 0 or fragment_id >= fragment_count:
+        return FORMAT_SOURCE
+    return None
+
+def decode_fragment(data, fragment_format=FORMAT_SOURCE):
+    if fragment_format == FORMAT_GOLDSRC:
+        return decode_goldsrc_fragment(data)
+    else:
+        return decode_source_fragment(data)
+
+def decode_source_fragment(data):
     reader = ByteReader(
         io.BytesIO(data), endian="<", encoding="utf-8")
     frag = A2SFragment(
@@ -32,8 +75,73 @@ def decode_fragment(data):
     if frag.is_compressed:
         frag.decompressed_size = reader.read_uint32()
         frag.crc = reader.read_uint32()
-        frag.payload = bz2.decompress(reader.read())
+        data = reader.read()
+        with stage("decompress"):
+            frag.payload = bz2.decompress(data)
     else:
         frag.payload = reader.read()
 
     return frag
+
+def decode_goldsrc_fragment(data):
+    reader = ByteReader(
+        io.BytesIO(data), endian="<", encoding="utf-8")
+    message_id = reader.read_uint32()
+    packet_number = reader.read_uint8()
+    return A2SFragment(
+        message_id=message_id,
+        fragment_count=packet_number & 0x0F,
+        fragment_id=packet_number >> 4,
+        mtu=0,
+        payload=reader.read()
+    )
+
+
+class FragmentBuffer:
+    """Collects the fragments of a split response. Until the format of the
+    server is known, packets are kept undecoded and decoded once the first
+    fragment arrives."""
+
+    def __init__(self, address):
+        self.address = address
+        self.fragment_format = fragment_formats.get(address)
+        self.undecoded = []
+        self.fragments = []
+
+    def add(self, data):
+        """Returns the fragments that could be decoded so far"""
+        with stage("reassemble"):
+            return self._add(data)
+
+    def _add(self, data):
+        if self.fragment_format is None:
+            self.undecoded.append(data)
+            self.fragment_format = detect_fragment_format(data)
+            if self.fragment_format is None:
+                if len(self.undecoded) < MAX_GOLDSRC_FRAGMENTS:
+                    return []
+                self.fragment_format = FORMAT_SOURCE
+            fragment_formats.set(self.address, self.fragment_format)
+            packets = self.undecoded
+            self.undecoded = []
+        else:
+            packets = [data]
+        decoded = [decode_fragment(packet, self.fragment_format)
+                   for packet in packets]
+        self.fragments += decoded
+        return decoded
+
+    @property
+    def complete(self):
+        return (len(self.fragments) > 0
+                and len(self.fragments) >= self.fragments[0].fragment_count)
+
+    def reassemble(self):
+        with stage("reassemble"):
+            self.fragments.sort(key=lambda f: f.fragment_id)
+            reassembled = b"".join(
+                fragment.payload for fragment in self.fragments)
+            # Sometimes there's an additional header present
+            if reassembled.startswith(HEADER_SIMPLE):
+                reassembled = reassembled[4:]
+            return reassembled
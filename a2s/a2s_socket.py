@@ -0,0 +1,57 @@
+import socket
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+
+
+# Linux only and not exported by the socket module
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+DROP_COUNTER_SUPPORTED = (
+    sys.platform.startswith("linux") and hasattr(socket.socket, "recvmsg"))
+ANCDATA_SIZE = socket.CMSG_SPACE(4) if DROP_COUNTER_SUPPORTED else 0
+
+
+@dataclass
+class SocketStats:
+    packets_sent: int = 0
+    """Number of datagrams handed to the kernel"""
+
+    packets_received: int = 0
+    """Number of datagrams read from the socket"""
+
+    bytes_received: int = 0
+    """Total size of the datagrams read from the socket"""
+
+    read_passes: int = 0
+    """Number of times the socket was drained, packets_received / read_passes
+    is the average burst size"""
+
+    kernel_drops: Optional[int] = None
+    """Datagrams the kernel dropped because the receive buffer was full,
+    None if the platform doesn't report it"""
+
+
+def set_buffer_sizes(sock, rcvbuf=None, sndbuf=None):
+    # The kernel silently caps these at net.core.rmem_max/wmem_max
+    if rcvbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    if sndbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+
+def enable_drop_counter(sock):
+    if not DROP_COUNTER_SUPPORTED:
+        return False
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+    except OSError:
+        return False
+    return True
+
+def parse_drop_counter(ancdata):
+    # The counter is only attached once the first drop happened
+    for cmsg_level, cmsg_type, cmsg_data in ancdata:
+        if (cmsg_level == socket.SOL_SOCKET and cmsg_type == SO_RXQ_OVFL
+                and len(cmsg_data) >= 4):
+            return int.from_bytes(cmsg_data[:4], sys.byteorder)
+    return None
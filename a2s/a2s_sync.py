@@ -4,9 +4,12 @@ import time
 import io
 
 from a2s.exceptions import BrokenMessageError
-from a2s.a2s_fragment import decode_fragment
+from a2s.a2s_fragment import FragmentBuffer
+from a2s.a2s_socket import set_buffer_sizes
 from a2s.defaults import DEFAULT_RETRIES
 from a2s.byteio import ByteReader
+from a2s.encoding import resolve_encoding
+from a2s.profiling import stage
 
 
 
@@ -19,6 +22,7 @@ logger = logging.getLogger("a2s")
 
 def request_sync(address, timeout, encoding, a2s_proto):
     conn = A2SStream(address, timeout)
+    encoding = resolve_encoding(encoding, address)
     response = request_sync_impl(conn, encoding, a2s_proto)
     conn.close()
     return response
@@ -47,14 +51,16 @@ def request_sync_impl(conn, encoding, a2s_proto, challenge=0, retries=0, ping=No
         raise BrokenMessageError(
             "Invalid response type: " + hex(response_type))
 
-    return a2s_proto.deserialize_response(reader, response_type, ping)
+    with stage("parse"):
+        return a2s_proto.deserialize_response(reader, response_type, ping)
 
 
 class A2SStream:
-    def __init__(self, address, timeout):
+    def __init__(self, address, timeout, rcvbuf=None, sndbuf=None):
         self.address = address
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._socket.settimeout(timeout)
+        set_buffer_sizes(self._socket, rcvbuf, sndbuf)
 
     def __del__(self):
         self.close()
@@ -64,25 +70,31 @@ class A2SStream:
         packet = HEADER_SIMPLE + data
         self._socket.sendto(packet, self.address)
 
+    def recv_packet(self):
+        return self.recv_packet_from()[0]
+
+    def recv_packet_from(self):
+        with stage("read"):
+            return self._socket.recvfrom(65535)
+
     def recv(self):
-        packet = self._socket.recv(65535)
+        packet, addr = self.recv_packet_from()
         header = packet[:4]
         data = packet[4:]
         if header == HEADER_SIMPLE:
             logger.debug("Received single packet: %r", data)
             return data
         elif header == HEADER_MULTI:
-            fragments = [decode_fragment(data)]
-            while len(fragments) < fragments[0].fragment_count:
-                packet = self._socket.recv(4096)
-                fragments.append(decode_fragment(packet[4:]))
-            fragments.sort(key=lambda f: f.fragment_id)
-            reassembled = b"".join(fragment.payload for fragment in fragments)
-            # Sometimes there's an additional header present
-            if reassembled.startswith(b"\xFF\xFF\xFF\xFF"):
-                reassembled = reassembled[4:]
+            # Keyed by the peer address like the async path, self.address
+            # can be a hostname
+            fragments = FragmentBuffer(addr)
+            fragments.add(data)
+            while not fragments.complete:
+                packet = self.recv_packet()
+                fragments.add(packet[4:])
+            reassembled = fragments.reassemble()
             logger.debug("Received %s part packet with content: %r",
-                         len(fragments), reassembled)
+                         len(fragments.fragments), reassembled)
             return reassembled
         else:
             raise BrokenMessageError(
@@ -0,0 +1,191 @@
+import socket
+import struct
+from collections.abc import MutableSet
+from typing import Iterable, Iterator, Optional, Union
+
+from a2s.defaults import DEFAULT_CONCURRENCY
+from a2s.a2s_async import resolve_address, run_bulk
+from a2s.info import SourceInfo, GoldSrcInfo
+
+
+
+# IPv4 address and port in network order
+ADDRESS_KEY = struct.Struct("!4sH")
+
+
+def pack_address(address):
+    """Packs an (IPv4 address, port) tuple into a 6 byte key, raises
+    ValueError for anything else"""
+    host, port = address
+    port = int(port)
+    if not 0 < port < 65536:
+        raise ValueError("Invalid port: " + repr(port))
+    try:
+        return ADDRESS_KEY.pack(socket.inet_pton(socket.AF_INET, host), port)
+    except (OSError, TypeError):
+        raise ValueError("Not an IPv4 address: " + repr(host)) from None
+
+def unpack_address(key):
+    packed_ip, port = ADDRESS_KEY.unpack(key)
+    return (socket.inet_ntop(socket.AF_INET, packed_ip), port)
+
+def resolve_sync(address):
+    host, port = address
+    host = host.strip()
+    try:
+        socket.inet_pton(socket.AF_INET, host)
+        return (host, int(port))
+    except OSError:
+        pass
+    addrinfo = socket.getaddrinfo(
+        host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    return addrinfo[0][4]
+
+
+class A2SAddressSet(MutableSet):
+    """Deduplicated set of IPv4 server addresses for bulk queries. Addresses
+    are kept as 6 byte keys, hostnames are resolved when they're added.
+
+    Servers listed under several addresses are merged with learn(): the game
+    port and Steam ID reported in an info response turn the other entries
+    into aliases. Aliases count as members but aren't iterated over, so a
+    sweep over the set queries every server only once. Set operators work
+    between sweeps, e.g. `current - previous` lists the new servers."""
+
+    def __init__(self, addresses: Iterable[tuple[str, int]] = ()):
+        self._keys = set()
+        # Alias key to the key of the same server that is in _keys
+        self._aliases = {}
+        self._steam_ids = {}
+        for address in addresses:
+            self.add(address)
+
+    def _canonical_key(self, key):
+        while key in self._aliases:
+            key = self._aliases[key]
+        return key
+
+    def __contains__(self, address):
+        try:
+            key = pack_address(address)
+        except ValueError:
+            return False
+        return self._canonical_key(key) in self._keys
+
+    def __iter__(self) -> Iterator[tuple[str, int]]:
+        for key in self._keys:
+            yield unpack_address(key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, list(self))
+
+    def add(self, address: tuple[str, int]) -> bool:
+        """Adds an address, resolving hostnames. Returns False if it was
+        already in the set or is an alias of a server in it."""
+        key = pack_address(resolve_sync(address))
+        return self._add_key(key)
+
+    def _add_key(self, key):
+        key = self._canonical_key(key)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        return True
+
+    def discard(self, address: tuple[str, int]):
+        try:
+            key = pack_address(address)
+        except ValueError:
+            return
+        self._keys.discard(self._canonical_key(key))
+
+    def update(self, addresses: Iterable[tuple[str, int]]) -> list[tuple[str, int]]:
+        """Adds all addresses and returns the ones that couldn't be resolved"""
+        failed = []
+        for address in addresses:
+            try:
+                self.add(address)
+            except (OSError, ValueError):
+                failed.append(address)
+        return failed
+
+    async def aupdate(
+        self,
+        addresses: Iterable[tuple[str, int]],
+        concurrency: int = DEFAULT_CONCURRENCY
+    ) -> list[tuple[str, int]]:
+        """Like update, but resolves hostnames concurrently"""
+        async def resolve(address):
+            try:
+                return pack_address(await resolve_address(address))
+            except (OSError, ValueError):
+                return None
+
+        addresses = list(addresses)
+        keys = await run_bulk(addresses, concurrency, resolve)
+        failed = []
+        for address, key in zip(addresses, keys):
+            if key is None:
+                failed.append(address)
+            else:
+                self._add_key(key)
+        return failed
+
+    def canonical(self, address: tuple[str, int]) -> Optional[tuple[str, int]]:
+        """Returns the address the server is listed under or None"""
+        try:
+            key = self._canonical_key(pack_address(address))
+        except ValueError:
+            return None
+        if key not in self._keys:
+            return None
+        return unpack_address(key)
+
+    def aliases(self) -> dict[tuple[str, int], tuple[str, int]]:
+        return {
+            unpack_address(alias): unpack_address(self._canonical_key(alias))
+            for alias in self._aliases
+        }
+
+    def add_alias(self, alias: tuple[str, int], address: tuple[str, int]):
+        """Marks alias as another address of the server at address"""
+        alias_key = self._canonical_key(pack_address(alias))
+        key = self._canonical_key(pack_address(address))
+        if alias_key == key:
+            return
+        self._add_key(key)
+        self._merge(alias_key, key)
+
+    def _merge(self, alias_key, key):
+        # Also merges everything that was already pointing to alias_key
+        self._keys.discard(alias_key)
+        self._aliases[alias_key] = key
+
+    def learn(self, address: tuple[str, int], info: Union[SourceInfo, GoldSrcInfo]):
+        """Merges entries of the server that sent info when queried at
+        address, which has to be an IPv4 address"""
+        key = self._canonical_key(pack_address(address))
+        self._add_key(key)
+
+        steam_id = getattr(info, "steam_id", None)
+        if steam_id:
+            known_key = self._steam_ids.get(steam_id)
+            if known_key is not None:
+                known_key = self._canonical_key(known_key)
+            if known_key is not None and known_key != key and known_key in self._keys:
+                self._merge(key, known_key)
+                key = known_key
+            else:
+                self._steam_ids[steam_id] = key
+
+        # The same server can be listed under its game port. Only unknown
+        # addresses are aliased, another server on the same host may already
+        # be listed under that port as its query port.
+        port = getattr(info, "port", None)
+        if port and port != address[1]:
+            port_key = pack_address((address[0], port))
+            if port_key not in self._keys and port_key not in self._aliases:
+                self._aliases[port_key] = key
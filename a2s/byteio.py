@@ -5,6 +5,21 @@ from a2s.exceptions import BufferExhaustedError
 
 
 
+def decode_string(raw, encoding):
+    if encoding is None:
+        return raw
+    elif isinstance(encoding, str):
+        return raw.decode(encoding, errors="replace")
+    else:
+        return encoding.decode(raw)
+
+def encode_string(text, encoding):
+    if isinstance(encoding, str):
+        return text.encode(encoding)
+    else:
+        return encoding.encode(text)
+
+
 class ByteReader():
     def __init__(self, stream, endian="=", encoding=None):
         self.stream = stream
@@ -68,11 +83,7 @@ class ByteReader():
         return bool(self.unpack_one("b"))
 
     def read_char(self):
-        char = self.unpack_one("c")
-        if self.encoding is not None:
-            return char.decode(self.encoding, errors="replace")
-        else:
-            return char
+        return decode_string(self.unpack_one("c"), self.encoding)
 
     def read_cstring(self, charsize=1):
         string = b""
@@ -83,10 +94,18 @@ class ByteReader():
             else:
                 string += c
 
-        if self.encoding is not None:
-            return string.decode(self.encoding, errors="replace")
-        else:
-            return string
+        return decode_string(string, self.encoding)
+
+    def skip_cstring(self, charsize=1):
+        if charsize == 1 and isinstance(self.stream, io.BytesIO):
+            # getvalue doesn't copy the buffer of an unmodified BytesIO
+            end = self.stream.getvalue().find(b"\0", self.stream.tell())
+            if end == -1:
+                raise BufferExhaustedError()
+            self.stream.seek(end + 1)
+            return
+        while int.from_bytes(self.read(charsize), "little") != 0:
+            pass
 
 
 class ByteWriter():
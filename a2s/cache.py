@@ -0,0 +1,39 @@
+import collections
+import threading
+
+
+
+class AddressCache:
+    """Thread-safe least recently used mapping from server address to
+    something learned about the server"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, address, default=None):
+        with self._lock:
+            try:
+                self._entries.move_to_end(address)
+            except KeyError:
+                return default
+            return self._entries[address]
+
+    def set(self, address, value):
+        with self._lock:
+            self._entries[address] = value
+            self._entries.move_to_end(address)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, address):
+        with self._lock:
+            self._entries.pop(address, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
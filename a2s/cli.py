@@ -0,0 +1,185 @@
+import argparse
+import codecs
+import sys
+import time
+
+
+
+DEFAULT_PORT = 27015
+QUERY_TYPES = ("info", "players", "rules", "probe")
+
+
+def parse_args(argv):
+    # Only the defaults module is imported here so --help stays fast
+    from a2s.defaults import (
+        DEFAULT_TIMEOUT, DEFAULT_ENCODING, DEFAULT_CONCURRENCY,
+        DEFAULT_SHARED_RCVBUF)
+
+    parser = argparse.ArgumentParser(
+        prog="a2s",
+        description="Query Source and GoldSource servers in bulk and write the "
+            "results as newline delimited JSON.")
+    parser.add_argument("input", nargs="?", default="-",
+        help="File with one host:port per line, - for stdin (default)")
+    parser.add_argument("-q", "--query", action="append", choices=QUERY_TYPES,
+        help="Query to run, can be given multiple times (default: info)")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+        help="Maximum number of servers queried at once (default: %(default)s)")
+    parser.add_argument("-t", "--timeout", type=float, default=DEFAULT_TIMEOUT,
+        help="Timeout per query in seconds (default: %(default)s)")
+    parser.add_argument("-e", "--encoding", default=DEFAULT_ENCODING,
+        help="String encoding, 'auto' to detect it per server, 'none' to output raw "
+            "bytes as latin-1 (default: %(default)s)")
+    parser.add_argument("-f", "--fields",
+        help="Comma separated info string fields to decode, others are null")
+    parser.add_argument("-o", "--output", default="-",
+        help="Output file, - for stdout (default)")
+    parser.add_argument("--rcvbuf", type=int, default=DEFAULT_SHARED_RCVBUF,
+        help="Socket receive buffer size in bytes (default: %(default)s)")
+    parser.add_argument("--max-rate", type=float,
+        help="Maximum packets sent per second (default: unlimited)")
+    parser.add_argument("--quiet", action="store_true",
+        help="Don't print the summary to stderr")
+    parser.add_argument("--profile", action="store_true",
+        help="Print time spent in each query stage to stderr")
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1:
+        parser.error("concurrency must be at least 1")
+    if args.encoding.lower() == "none":
+        args.encoding = None
+    elif args.encoding != "auto":
+        try:
+            codecs.lookup(args.encoding)
+        except LookupError:
+            parser.error("unknown encoding: " + args.encoding)
+    if args.fields is not None:
+        from a2s.info import INFO_FIELDS
+        args.fields = [field.strip() for field in args.fields.split(",")]
+        unknown = set(args.fields) - INFO_FIELDS
+        if unknown:
+            parser.error("unknown info fields: " + ", ".join(sorted(unknown)))
+    args.query = args.query or ["info"]
+    return args
+
+def parse_address(line):
+    host, sep, port = line.rpartition(":")
+    if not sep:
+        return (line, DEFAULT_PORT)
+    port = int(port)
+    if not 0 < port < 65536:
+        raise ValueError("Port out of range: " + str(port))
+    return (host, port)
+
+def read_addresses(lines, errors):
+    for line_num, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield parse_address(line)
+        except ValueError:
+            errors.append("line {}: invalid address {!r}".format(line_num, line))
+
+def describe_error(exc):
+    message = str(exc)
+    if message:
+        return type(exc).__name__ + ": " + message
+    return type(exc).__name__
+
+
+async def scan(args, addresses, output):
+    import asyncio
+    from a2s.exceptions import BrokenMessageError
+    from a2s.a2s_async import A2SSharedSocket, request_shared
+    from a2s.info import InfoProtocol
+    from a2s.players import PlayersProtocol
+    from a2s.rules import RulesProtocol
+    from a2s.probe import probe_shared
+    from a2s.ndjson import dump_str, dump_value
+
+    protocols = {
+        "info": InfoProtocol(args.fields),
+        "players": PlayersProtocol,
+        "rules": RulesProtocol(),
+    }
+    counts = {"servers": 0, "failed": 0}
+
+    async def query_server(shared, address):
+        parts = ['{"address":', dump_str("{}:{}".format(*address))]
+        errors = []
+        for query in args.query:
+            try:
+                if query == "probe":
+                    result = await probe_shared(shared, address, args.timeout)
+                else:
+                    result = await request_shared(
+                        shared, address, args.timeout, args.encoding,
+                        protocols[query])
+            except (OSError, asyncio.TimeoutError, BrokenMessageError) as exc:
+                errors.append((query, exc))
+                continue
+            parts += [',', dump_str(query), ':', dump_value(result)]
+        if errors:
+            counts["failed"] += 1
+            parts.append(',"errors":{')
+            parts.append(",".join(
+                dump_str(query) + ":" + dump_str(describe_error(exc))
+                for query, exc in errors))
+            parts.append("}")
+        parts.append("}\n")
+        output.write("".join(parts))
+        counts["servers"] += 1
+
+    async def worker(shared):
+        for address in addresses:
+            await query_server(shared, address)
+
+    shared = await A2SSharedSocket.create(args.rcvbuf, None, args.max_rate)
+    try:
+        await asyncio.gather(
+            *(worker(shared) for worker_num in range(args.concurrency)))
+    finally:
+        shared.close()
+    return counts, shared.stats
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    import asyncio
+    if args.profile:
+        from a2s import profiling
+        profiling.enable()
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    input_errors = []
+    start_time = time.monotonic()
+    try:
+        counts, stats = asyncio.run(scan(
+            args, read_addresses(input_file, input_errors), output))
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        output.flush()
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output is not sys.stdout:
+            output.close()
+    duration = time.monotonic() - start_time
+
+    for error in input_errors:
+        print("a2s: " + error, file=sys.stderr)
+    if not args.quiet:
+        drops = "" if stats.kernel_drops is None else (
+            ", {} dropped by the kernel".format(stats.kernel_drops))
+        print(
+            "{} servers ({} with errors) in {:.2f} s, {:.1f} servers/s, "
+            "{} packets sent, {} received{}".format(
+                counts["servers"], counts["failed"], duration,
+                counts["servers"] / duration if duration else 0.0,
+                stats.packets_sent, stats.packets_received, drops),
+            file=sys.stderr)
+    if args.profile:
+        print(profiling.format_report(), file=sys.stderr)
+    return 1 if input_errors else 0
@@ -1,3 +1,6 @@
 DEFAULT_TIMEOUT = 3.0
 DEFAULT_ENCODING = "utf-8"
 DEFAULT_RETRIES = 5
+DEFAULT_CONCURRENCY = 200
+DEFAULT_SHARED_RCVBUF = 4 * 1024 * 1024
+DEFAULT_CACHE_SIZE = 65536
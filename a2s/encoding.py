@@ -0,0 +1,76 @@
+import re
+
+from a2s.cache import AddressCache
+from a2s.defaults import DEFAULT_CACHE_SIZE
+
+
+
+# Pass as encoding to detect the encoding of each server
+ENCODING_AUTO = "auto"
+
+# Strings with fewer non-ASCII bytes are decoded with a guess, but the guess
+# isn't remembered for the server
+MIN_DETECT_BYTES = 4
+
+# Detected encoding of every server queried with ENCODING_AUTO
+server_encodings = AddressCache(DEFAULT_CACHE_SIZE)
+
+NON_ASCII_RUN = re.compile(rb"[\x80-\xFF]+")
+
+
+def detect_encoding(raw):
+    try:
+        raw.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    # Common hanzi are in GB2312 level 1, lead bytes 0xB0 to 0xD7, and make
+    # up almost all of real text. Cyrillic text mostly decodes to rare level 2
+    # characters or not at all.
+    try:
+        text = raw.decode("gbk")
+    except UnicodeDecodeError:
+        pass
+    else:
+        leads = [char.encode("gbk")[0] for char in text if ord(char) >= 0x80]
+        common = sum(0xB0 <= lead <= 0xD7 for lead in leads)
+        if leads and common >= 0.8 * len(leads):
+            return "gbk"
+
+    # Cyrillic words consist of non-ASCII bytes only, western text has
+    # single accented letters between ASCII ones
+    runs = NON_ASCII_RUN.findall(raw)
+    if sum(map(len, runs)) >= 2 * len(runs):
+        return "cp1251"
+    return "cp1252"
+
+
+class ServerEncoding:
+    """Decodes the strings of one server. ASCII strings are decoded directly,
+    the encoding is detected from the first string that isn't ASCII and
+    remembered for the address."""
+
+    def __init__(self, address):
+        self.address = address
+        self.encoding = server_encodings.get(address)
+
+    def decode(self, raw):
+        if raw.isascii():
+            return raw.decode("ascii")
+        if self.encoding is not None:
+            return raw.decode(self.encoding, errors="replace")
+
+        encoding = detect_encoding(raw)
+        if sum(byte >= 0x80 for byte in raw) >= MIN_DETECT_BYTES:
+            self.encoding = encoding
+            server_encodings.set(self.address, encoding)
+        return raw.decode(encoding, errors="replace")
+
+    def encode(self, text):
+        return text.encode(self.encoding or "ascii")
+
+def resolve_encoding(encoding, address):
+    if encoding == ENCODING_AUTO:
+        return ServerEncoding(address)
+    return encoding
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Optional, Iterable, Iterator, Union
+
+from a2s.defaults import (
+    DEFAULT_TIMEOUT, DEFAULT_ENCODING, DEFAULT_CONCURRENCY,
+    DEFAULT_SHARED_RCVBUF)
+from a2s.a2s_async import A2SSharedSocket, request_shared
+from a2s.a2s_socket import SocketStats
+from a2s.info import InfoProtocol
+from a2s.players import PlayersProtocol
+from a2s.rules import RulesProtocol
+from a2s.probe import probe_shared
+
+
+
+class A2SExecutor:
+    """Runs queries on an event loop in a background thread, sharing a single
+    socket. Can be used from any number of threads, results are returned as
+    concurrent.futures.Future objects."""
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        rcvbuf: Optional[int] = DEFAULT_SHARED_RCVBUF,
+        sndbuf: Optional[int] = None,
+        max_rate: Optional[float] = None
+    ):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run_loop, name="a2s-executor", daemon=True)
+        self._shutdown_lock = threading.Lock()
+        self._shutdown = False
+        self._thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self._setup(max_concurrency, rcvbuf, sndbuf, max_rate),
+                self._loop).result()
+        except BaseException:
+            self._shutdown = True
+            asyncio.run_coroutine_threadsafe(self._stop(), self._loop)
+            self._thread.join()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown(wait=True)
+        return False
+
+    @property
+    def stats(self) -> SocketStats:
+        return self._shared.stats
+
+    def submit_info(
+        self,
+        address: tuple[str, int],
+        timeout: float = DEFAULT_TIMEOUT,
+        encoding: Union[str, None] = DEFAULT_ENCODING,
+        fields: Optional[Iterable[str]] = None
+    ) -> Future:
+        return self._submit(self._request(
+            address, timeout, encoding, InfoProtocol(fields)))
+
+    def submit_players(
+        self,
+        address: tuple[str, int],
+        timeout: float = DEFAULT_TIMEOUT,
+        encoding: Union[str, None] = DEFAULT_ENCODING
+    ) -> Future:
+        return self._submit(self._request(
+            address, timeout, encoding, PlayersProtocol))
+
+    def submit_rules(
+        self,
+        address: tuple[str, int],
+        timeout: float = DEFAULT_TIMEOUT,
+        encoding: Union[str, None] = DEFAULT_ENCODING,
+        lazy: bool = False
+    ) -> Future:
+        return self._submit(self._request(
+            address, timeout, encoding, RulesProtocol(lazy)))
+
+    def submit_probe(
+        self,
+        address: tuple[str, int],
+        timeout: float = DEFAULT_TIMEOUT
+    ) -> Future:
+        return self._submit(self._probe(address, timeout))
+
+    def map_info(
+        self,
+        addresses: Iterable[tuple[str, int]],
+        timeout: float = DEFAULT_TIMEOUT,
+        encoding: Union[str, None] = DEFAULT_ENCODING,
+        fields: Optional[Iterable[str]] = None
+    ) -> Iterator:
+        a2s_proto = InfoProtocol(fields)
+        return self._map(
+            self._request(address, timeout, encoding, a2s_proto)
+            for address in addresses)
+
+    def map_players(
+        self,
+        addresses: Iterable[tuple[str, int]],
+        timeout: float = DEFAULT_TIMEOUT,
+        encoding: Union[str, None] = DEFAULT_ENCODING
+    ) -> Iterator:
+        return self._map(
+            self._request(address, timeout, encoding, PlayersProtocol)
+            for address in addresses)
+
+    def map_rules(
+        self,
+        addresses: Iterable[tuple[str, int]],
+        timeout: float = DEFAULT_TIMEOUT,
+        encoding: Union[str, None] = DEFAULT_ENCODING,
+        lazy: bool = False
+    ) -> Iterator:
+        a2s_proto = RulesProtocol(lazy)
+        return self._map(
+            self._request(address, timeout, encoding, a2s_proto)
+            for address in addresses)
+
+    def map_probe(
+        self,
+        addresses: Iterable[tuple[str, int]],
+        timeout: float = DEFAULT_TIMEOUT
+    ) -> Iterator:
+        return self._map(
+            self._probe(address, timeout) for address in addresses)
+
+    def shutdown(self, wait: bool = True):
+        with self._shutdown_lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop)
+        if wait:
+            self._thread.join()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _setup(self, max_concurrency, rcvbuf, sndbuf, max_rate):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._shared = await A2SSharedSocket.create(rcvbuf, sndbuf, max_rate)
+
+    async def _close(self):
+        # Let already submitted queries finish, like concurrent.futures does
+        pending = asyncio.all_tasks() - {asyncio.current_task()}
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._shared.close()
+        await self._stop()
+
+    async def _stop(self):
+        await self._loop.shutdown_default_executor()
+        self._loop.stop()
+
+    async def _request(self, address, timeout, encoding, a2s_proto):
+        async with self._semaphore:
+            return await request_shared(
+                self._shared, address, timeout, encoding, a2s_proto)
+
+    async def _probe(self, address, timeout):
+        async with self._semaphore:
+            return await probe_shared(self._shared, address, timeout)
+
+    def _submit(self, coro):
+        with self._shutdown_lock:
+            if self._shutdown:
+                coro.close()
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _map(self, coros):
+        futures = [self._submit(coro) for coro in coros]
+
+        def result_iterator():
+            try:
+                for future in futures:
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        return result_iterator()
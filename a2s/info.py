@@ -1,9 +1,10 @@
 import io
-from dataclasses import dataclass
-from typing import Optional, Generic, Union, TypeVar, overload
+from dataclasses import dataclass, fields as dataclass_fields
+from typing import Optional, Generic, Union, TypeVar, Iterable, overload
 
 from a2s.exceptions import BrokenMessageError, BufferExhaustedError
 from a2s.defaults import DEFAULT_TIMEOUT, DEFAULT_ENCODING
+from a2s.profiling import stage
 from a2s.a2s_sync import request_sync
 from a2s.a2s_async import request_async
 from a2s.byteio import ByteReader
@@ -186,37 +187,52 @@ class GoldSrcInfo(Generic[StrType]):
 
 
 @overload
-def info(address: tuple[str, int], timeout: float, encoding: str) -> Union[SourceInfo[str], GoldSrcInfo[str]]:
+def info(address: tuple[str, int], timeout: float, encoding: str, fields: Optional[Iterable[str]] = None) -> Union[SourceInfo[str], GoldSrcInfo[str]]:
     ...
 
 @overload
-def info(address: tuple[str, int], timeout: float, encoding: None) -> Union[SourceInfo[bytes], GoldSrcInfo[bytes]]:
+def info(address: tuple[str, int], timeout: float, encoding: None, fields: Optional[Iterable[str]] = None) -> Union[SourceInfo[bytes], GoldSrcInfo[bytes]]:
     ...
 
 def info(
     address: tuple[str, int],
     timeout: float = DEFAULT_TIMEOUT,
-    encoding: Union[str, None] = DEFAULT_ENCODING
+    encoding: Union[str, None] = DEFAULT_ENCODING,
+    fields: Optional[Iterable[str]] = None
 ) -> Union[SourceInfo[str], SourceInfo[bytes], GoldSrcInfo[str], GoldSrcInfo[bytes]]:
-    return request_sync(address, timeout, encoding, InfoProtocol)
+    return request_sync(address, timeout, encoding, InfoProtocol(fields))
 
 @overload
-async def ainfo(address: tuple[str, int], timeout: float, encoding: str) -> Union[SourceInfo[str], GoldSrcInfo[str]]:
+async def ainfo(address: tuple[str, int], timeout: float, encoding: str, fields: Optional[Iterable[str]] = None) -> Union[SourceInfo[str], GoldSrcInfo[str]]:
     ...
 
 @overload
-async def ainfo(address: tuple[str, int], timeout: float, encoding: None) -> Union[SourceInfo[bytes], GoldSrcInfo[bytes]]:
+async def ainfo(address: tuple[str, int], timeout: float, encoding: None, fields: Optional[Iterable[str]] = None) -> Union[SourceInfo[bytes], GoldSrcInfo[bytes]]:
     ...
 
 async def ainfo(
     address: tuple[str, int],
     timeout: float = DEFAULT_TIMEOUT,
-    encoding: Union[str, None] = DEFAULT_ENCODING
+    encoding: Union[str, None] = DEFAULT_ENCODING,
+    fields: Optional[Iterable[str]] = None
 ) -> Union[SourceInfo[str], SourceInfo[bytes], GoldSrcInfo[str], GoldSrcInfo[bytes]]:
-    return await request_async(address, timeout, encoding, InfoProtocol)
+    return await request_async(address, timeout, encoding, InfoProtocol(fields))
 
 
+INFO_FIELDS = frozenset(
+    field.name for cls in (SourceInfo, GoldSrcInfo) for field in dataclass_fields(cls))
+
 class InfoProtocol:
+    def __init__(self, fields=None):
+        # Only string fields listed in fields are decoded, the others are
+        # skipped and left as None. Numeric fields are always filled in.
+        if fields is not None:
+            fields = frozenset(fields)
+            unknown = fields - INFO_FIELDS
+            if unknown:
+                raise ValueError("Unknown info fields: " + ", ".join(sorted(unknown)))
+        self.fields = fields
+
     @staticmethod
     def validate_response_type(response_type):
         return response_type in (A2S_INFO_RESPONSE, A2S_INFO_RESPONSE_LEGACY)
@@ -228,76 +244,92 @@ class InfoProtocol:
         else:
             return b"\x54Source Engine Query\0"
 
-    @staticmethod
-    def deserialize_response(reader, response_type, ping):
+    def deserialize_response(self, reader, response_type, ping):
         if response_type == A2S_INFO_RESPONSE:
-            resp = parse_source(reader, ping)
+            resp = parse_source(reader, ping, self.fields)
         elif response_type == A2S_INFO_RESPONSE_LEGACY:
-            resp = parse_goldsrc(reader, ping)
+            resp = parse_goldsrc(reader, ping, self.fields)
         else:
             raise Exception(str(response_type))
 
         return resp
 
-def parse_source(reader, ping):
+def read_cstring_field(reader, fields, name):
+    if fields is None or name in fields:
+        return reader.read_cstring()
+    reader.skip_cstring()
+    return None
+
+def read_char_field(reader, fields, name):
+    if fields is None or name in fields:
+        return reader.read_char()
+    reader.read(1)
+    return None
+
+def parse_source(reader, ping, fields=None):
     protocol = reader.read_uint8()
-    server_name = reader.read_cstring()
-    map_name = reader.read_cstring()
-    folder = reader.read_cstring()
-    game = reader.read_cstring()
+    server_name = read_cstring_field(reader, fields, "server_name")
+    map_name = read_cstring_field(reader, fields, "map_name")
+    folder = read_cstring_field(reader, fields, "folder")
+    game = read_cstring_field(reader, fields, "game")
     app_id = reader.read_uint16()
     player_count = reader.read_uint8()
     max_players = reader.read_uint8()
     bot_count = reader.read_uint8()
-    server_type = reader.read_char().lower()
-    platform = reader.read_char().lower()
+    server_type = read_char_field(reader, fields, "server_type")
+    if server_type is not None:
+        server_type = server_type.lower()
+    platform = read_char_field(reader, fields, "platform")
+    if platform is not None:
+        platform = platform.lower()
     if platform == "o": # Deprecated mac value
         platform = "m"
     password_protected = reader.read_bool()
     vac_enabled = reader.read_bool()
-    version = reader.read_cstring()
+    version = read_cstring_field(reader, fields, "version")
 
     try:
         edf = reader.read_uint8()
     except BufferExhaustedError:
         edf = 0
 
-    resp = SourceInfo(
-        protocol, server_name, map_name, folder, game, app_id, player_count, max_players,
-        bot_count, server_type, platform, password_protected, vac_enabled, version, edf, ping
-    )
+    with stage("build_result"):
+        resp = SourceInfo(
+            protocol, server_name, map_name, folder, game, app_id, player_count, max_players,
+            bot_count, server_type, platform, password_protected, vac_enabled, version, edf, ping
+        )
     if resp.has_port:
         resp.port = reader.read_uint16()
     if resp.has_steam_id:
         resp.steam_id = reader.read_uint64()
     if resp.has_stv:
         resp.stv_port = reader.read_uint16()
-        resp.stv_name = reader.read_cstring()
+        resp.stv_name = read_cstring_field(reader, fields, "stv_name")
     if resp.has_keywords:
-        resp.keywords = reader.read_cstring()
+        resp.keywords = read_cstring_field(reader, fields, "keywords")
     if resp.has_game_id:
         resp.game_id = reader.read_uint64()
 
     return resp
 
-def parse_goldsrc(reader, ping):
-    address = reader.read_cstring()
-    server_name = reader.read_cstring()
-    map_name = reader.read_cstring()
-    folder = reader.read_cstring()
-    game = reader.read_cstring()
+def parse_goldsrc(reader, ping, fields=None):
+    address = read_cstring_field(reader, fields, "address")
+    server_name = read_cstring_field(reader, fields, "server_name")
+    map_name = read_cstring_field(reader, fields, "map_name")
+    folder = read_cstring_field(reader, fields, "folder")
+    game = read_cstring_field(reader, fields, "game")
     player_count = reader.read_uint8()
     max_players = reader.read_uint8()
     protocol = reader.read_uint8()
-    server_type = reader.read_char()
-    platform = reader.read_char()
+    server_type = read_char_field(reader, fields, "server_type")
+    platform = read_char_field(reader, fields, "platform")
     password_protected = reader.read_bool()
     is_mod = reader.read_bool()
 
     # Some games don't send this section
     if is_mod and len(reader.peek()) > 2:
-        mod_website = reader.read_cstring()
-        mod_download = reader.read_cstring()
+        mod_website = read_cstring_field(reader, fields, "mod_website")
+        mod_download = read_cstring_field(reader, fields, "mod_download")
         reader.read(1) # Skip a NULL byte
         mod_version = reader.read_uint32()
         mod_size = reader.read_uint32()
@@ -314,8 +346,9 @@ def parse_goldsrc(reader, ping):
     vac_enabled = reader.read_bool()
     bot_count = reader.read_uint8()
 
-    return GoldSrcInfo(
-        address, server_name, map_name, folder, game, player_count, max_players, protocol,
-        server_type, platform, password_protected, is_mod, vac_enabled, bot_count, mod_website,
-        mod_download, mod_version, mod_size, multiplayer_only, uses_custom_dll, ping
-    )
+    with stage("build_result"):
+        return GoldSrcInfo(
+            address, server_name, map_name, folder, game, player_count, max_players, protocol,
+            server_type, platform, password_protected, is_mod, vac_enabled, bot_count, ping,
+            mod_website, mod_download, mod_version, mod_size, multiplayer_only, uses_custom_dll
+        )
@@ -0,0 +1,53 @@
+from json.encoder import encode_basestring_ascii as dump_str
+from math import isfinite
+
+
+
+# Type -> list of ("key":, field name) pairs for dataclasses
+DATACLASS_KEYS = {}
+
+
+def dump_value(value):
+    """Serializes query results to JSON, faster than json.dumps(asdict())
+    because dataclasses aren't copied into dicts first. Bytes are written as
+    latin-1 strings."""
+    value_type = type(value)
+    if value_type is str:
+        return dump_str(value)
+    elif value is None:
+        return "null"
+    elif value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    elif value_type is int:
+        return str(value)
+    elif value_type is float:
+        return repr(value) if isfinite(value) else "null"
+    elif value_type is bytes:
+        return dump_str(value.decode("latin-1"))
+    elif value_type is list or value_type is tuple:
+        return "[" + ",".join([dump_value(item) for item in value]) + "]"
+
+    keys = DATACLASS_KEYS.get(value_type)
+    if keys is None and hasattr(value_type, "__dataclass_fields__"):
+        keys = [
+            (dump_str(name) + ":", name)
+            for name in value_type.__dataclass_fields__
+        ]
+        DATACLASS_KEYS[value_type] = keys
+    if keys is not None:
+        return "{" + ",".join([
+            key + dump_value(getattr(value, name)) for key, name in keys
+        ]) + "}"
+
+    if hasattr(value, "items"):
+        return "{" + ",".join([
+            dump_key(key) + ":" + dump_value(item) for key, item in value.items()
+        ]) + "}"
+    return dump_value(str(value))
+
+def dump_key(key):
+    if type(key) is bytes:
+        return dump_str(key.decode("latin-1"))
+    return dump_str(str(key))
@@ -1,10 +1,11 @@
 import io
 from dataclasses import dataclass
-from typing import Generic, Union, TypeVar, overload
+from typing import Generic, Union, TypeVar, AsyncIterator, overload
 
 from a2s.defaults import DEFAULT_TIMEOUT, DEFAULT_ENCODING
+from a2s.profiling import stage
 from a2s.a2s_sync import request_sync
-from a2s.a2s_async import request_async
+from a2s.a2s_async import request_async, request_async_iter
 from a2s.byteio import ByteReader
 
 
@@ -59,6 +60,14 @@ async def aplayers(
 ) -> Union[list[Player[str]], list[Player[bytes]]]:
     return await request_async(address, timeout, encoding, PlayersProtocol)
 
+def aplayers_iter(
+    address: tuple[str, int],
+    timeout: float = DEFAULT_TIMEOUT,
+    encoding: Union[str, None] = DEFAULT_ENCODING
+) -> Union[AsyncIterator[Player[str]], AsyncIterator[Player[bytes]]]:
+    """Yields players while the response is still arriving"""
+    return request_async_iter(address, timeout, encoding, PlayersProtocol)
+
 
 class PlayersProtocol:
     @staticmethod
@@ -71,14 +80,22 @@ class PlayersProtocol:
 
     @staticmethod
     def deserialize_response(reader, response_type, ping):
-        player_count = reader.read_uint8()
+        player_count = PlayersProtocol.deserialize_count(reader)
         resp = [
-            Player(
-                index=reader.read_uint8(),
-                name=reader.read_cstring(),
-                score=reader.read_int32(),
-                duration=reader.read_float()
-            )
+            PlayersProtocol.deserialize_entry(reader)
             for player_num in range(player_count)
         ]
         return resp
+
+    @staticmethod
+    def deserialize_count(reader):
+        return reader.read_uint8()
+
+    @staticmethod
+    def deserialize_entry(reader):
+        index = reader.read_uint8()
+        name = reader.read_cstring()
+        score = reader.read_int32()
+        duration = reader.read_float()
+        with stage("build_result"):
+            return Player(index=index, name=name, score=score, duration=duration)
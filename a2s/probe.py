@@ -0,0 +1,153 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional, Iterable
+
+from a2s.exceptions import BrokenMessageError, BufferExhaustedError
+from a2s.defaults import DEFAULT_TIMEOUT, DEFAULT_CONCURRENCY
+from a2s.a2s_sync import A2SStream, HEADER_SIMPLE, HEADER_MULTI
+from a2s.a2s_async import A2SSharedSocket, run_bulk
+
+
+
+A2S_CHALLENGE_RESPONSE = 0x41
+A2S_INFO_RESPONSE = 0x49
+A2S_INFO_RESPONSE_LEGACY = 0x6D
+
+# An info request without challenge is answered by every server, either with
+# the info itself or with a short challenge response
+PROBE_REQUEST = b"\x54Source Engine Query\0"
+PROBE_RESPONSE_TYPES = (
+    A2S_CHALLENGE_RESPONSE, A2S_INFO_RESPONSE, A2S_INFO_RESPONSE_LEGACY)
+
+
+@dataclass
+class ProbeResult:
+    address: tuple[str, int]
+    """Address of the server as passed to the probe"""
+
+    reachable: bool
+    """Server answered with a valid A2S response"""
+
+    ping: Optional[float]
+    """Round-trip time for the probe in seconds, None if unreachable"""
+
+    response_type: Optional[int]
+    """Type byte of the response, None if unreachable or the response was
+    split into multiple packets"""
+
+
+def probe(
+    address: tuple[str, int],
+    timeout: float = DEFAULT_TIMEOUT
+) -> ProbeResult:
+    conn = A2SStream(address, timeout)
+    try:
+        send_time = time.monotonic()
+        conn.send(PROBE_REQUEST)
+        packet = conn.recv_packet()
+        recv_time = time.monotonic()
+        response_type = parse_probe_reply(packet)
+    except (OSError, BrokenMessageError):
+        return ProbeResult(address, False, None, None)
+    finally:
+        conn.close()
+
+    return ProbeResult(address, True, recv_time - send_time, response_type)
+
+async def aprobe(
+    address: tuple[str, int],
+    timeout: float = DEFAULT_TIMEOUT
+) -> ProbeResult:
+    loop = asyncio.get_running_loop()
+    try:
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: A2SProbeProtocol(), remote_addr=address)
+    except OSError:
+        return ProbeResult(address, False, None, None)
+
+    try:
+        send_time = time.monotonic()
+        transport.sendto(HEADER_SIMPLE + PROBE_REQUEST)
+        packet, recv_time = await asyncio.wait_for(protocol.reply, timeout)
+        response_type = parse_probe_reply(packet)
+    except (OSError, asyncio.TimeoutError, BrokenMessageError):
+        return ProbeResult(address, False, None, None)
+    finally:
+        transport.close()
+
+    return ProbeResult(address, True, recv_time - send_time, response_type)
+
+def probe_many(
+    addresses: Iterable[tuple[str, int]],
+    timeout: float = DEFAULT_TIMEOUT,
+    concurrency: int = DEFAULT_CONCURRENCY
+) -> list[ProbeResult]:
+    return asyncio.run(aprobe_many(addresses, timeout, concurrency))
+
+async def aprobe_many(
+    addresses: Iterable[tuple[str, int]],
+    timeout: float = DEFAULT_TIMEOUT,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    shared: Optional[A2SSharedSocket] = None
+) -> list[ProbeResult]:
+    if shared is not None:
+        return await run_bulk(addresses, concurrency,
+            lambda address: probe_shared(shared, address, timeout))
+
+    shared = await A2SSharedSocket.create()
+    try:
+        return await run_bulk(addresses, concurrency,
+            lambda address: probe_shared(shared, address, timeout))
+    finally:
+        shared.close()
+
+async def probe_shared(shared, address, timeout):
+    protocol = A2SProbeProtocol()
+    try:
+        addr = await shared.register(address, protocol)
+    except OSError:
+        return ProbeResult(address, False, None, None)
+
+    try:
+        await shared.pace()
+        send_time = time.monotonic()
+        shared.sendto(PROBE_REQUEST, addr)
+        packet, recv_time = await asyncio.wait_for(protocol.reply, timeout)
+        response_type = parse_probe_reply(packet)
+    except (OSError, asyncio.TimeoutError, BrokenMessageError):
+        return ProbeResult(address, False, None, None)
+    finally:
+        shared.unregister(addr, protocol)
+
+    return ProbeResult(address, True, recv_time - send_time, response_type)
+
+def parse_probe_reply(packet):
+    header = packet[:4]
+    if header == HEADER_MULTI:
+        # The response type is only known after reassembly
+        return None
+    elif header != HEADER_SIMPLE:
+        raise BrokenMessageError(
+            "Invalid packet header: " + repr(header))
+
+    if len(packet) < 5:
+        raise BufferExhaustedError()
+    response_type = packet[4]
+    if response_type not in PROBE_RESPONSE_TYPES:
+        raise BrokenMessageError(
+            "Invalid response type: " + hex(response_type))
+    return response_type
+
+
+class A2SProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.reply = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, packet, addr):
+        if not self.reply.done():
+            self.reply.set_result((packet, time.monotonic()))
+
+    def error_received(self, exc):
+        if not self.reply.done():
+            self.reply.set_exception(exc)
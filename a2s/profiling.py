@@ -0,0 +1,112 @@
+import contextlib
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, replace
+
+
+
+STAGES = ("read", "reassemble", "decompress", "parse", "build_result")
+
+NULL_STAGE = contextlib.nullcontext()
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    """Number of times the stage ran"""
+
+    time: float = 0.0
+    """Wall time in seconds, without the time of stages nested inside"""
+
+    allocated: int = 0
+    """Net bytes allocated, negative if more was freed, without nested
+    stages. Only counted when memory tracing is enabled."""
+
+    @property
+    def time_per_call(self):
+        return self.time / self.calls if self.calls else 0.0
+
+
+enabled = False
+_trace_memory = False
+_started_tracemalloc = False
+_stats = {name: StageStats() for name in STAGES}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        memory = tracemalloc.get_traced_memory()[0] if _trace_memory else 0
+        # [start time, start memory, time of children, memory of children]
+        stack.append([time.perf_counter(), memory, 0.0, 0])
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end_time = time.perf_counter()
+        memory = tracemalloc.get_traced_memory()[0] if _trace_memory else 0
+        stack = _local.stack
+        start_time, start_memory, child_time, child_memory = stack.pop()
+        elapsed = end_time - start_time
+        allocated = memory - start_memory
+        if stack:
+            stack[-1][2] += elapsed
+            stack[-1][3] += allocated
+        with _lock:
+            stats = _stats[self.name]
+            stats.calls += 1
+            stats.time += elapsed - child_time
+            stats.allocated += allocated - child_memory
+
+_stages = {name: Stage(name) for name in STAGES}
+
+
+def stage(name):
+    """Context manager that measures one stage of a query, does nothing while
+    profiling is disabled"""
+    if not enabled:
+        return NULL_STAGE
+    return _stages[name]
+
+def enable(trace_memory=False):
+    global enabled, _trace_memory, _started_tracemalloc
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+    _trace_memory = trace_memory
+    enabled = True
+
+def disable():
+    global enabled, _trace_memory, _started_tracemalloc
+    enabled = False
+    _trace_memory = False
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+def reset():
+    with _lock:
+        for name in STAGES:
+            _stats[name] = StageStats()
+
+def report():
+    """Returns a copy of the statistics of every stage"""
+    with _lock:
+        return {name: replace(stats) for name, stats in _stats.items()}
+
+def format_report(stats=None):
+    if stats is None:
+        stats = report()
+    lines = ["{:<14}{:>10}{:>12}{:>14}{:>14}".format(
+        "stage", "calls", "total ms", "us per call", "allocated")]
+    for name, stage_stats in stats.items():
+        lines.append("{:<14}{:>10}{:>12.2f}{:>14.2f}{:>14}".format(
+            name, stage_stats.calls, stage_stats.time * 1000,
+            stage_stats.time_per_call * 1000000, stage_stats.allocated))
+    return "\n".join(lines)
@@ -1,48 +1,125 @@
 import io
-from typing import overload, Union
+from collections.abc import Mapping
+from typing import overload, Union, Literal, AsyncIterator
 
+from a2s.exceptions import BufferExhaustedError
 from a2s.defaults import DEFAULT_TIMEOUT, DEFAULT_ENCODING
+from a2s.profiling import stage
 from a2s.a2s_sync import request_sync
-from a2s.a2s_async import request_async
-from a2s.byteio import ByteReader
+from a2s.a2s_async import request_async, request_async_iter
+from a2s.byteio import ByteReader, decode_string, encode_string
 
 
 
 A2S_RULES_RESPONSE = 0x45
 
 
+class LazyRules(Mapping):
+    """Read-only rules mapping that keeps the raw response and only decodes
+    keys and values when they are accessed."""
+
+    def __init__(self, data, rule_count, encoding):
+        self._data = data
+        self._encoding = encoding
+        self._index = {}
+        self._decoded_index = None
+        pos = 0
+        for rule_num in range(rule_count):
+            key_end = data.find(b"\0", pos)
+            if key_end == -1:
+                raise BufferExhaustedError()
+            value_end = data.find(b"\0", key_end + 1)
+            if value_end == -1:
+                raise BufferExhaustedError()
+            self._index[data[pos:key_end]] = (key_end + 1, value_end)
+            pos = value_end + 1
+
+    def _decode(self, raw):
+        return decode_string(raw, self._encoding)
+
+    def _lookup(self, key):
+        if self._encoding is None:
+            return self._index[key]
+        try:
+            return self._index[encode_string(key, self._encoding)]
+        except (KeyError, AttributeError, UnicodeEncodeError):
+            pass
+        # Keys with undecodable bytes don't survive the round trip
+        if self._decoded_index is None:
+            self._decoded_index = {
+                self._decode(raw_key): offsets
+                for raw_key, offsets in self._index.items()
+            }
+        return self._decoded_index[key]
+
+    def __getitem__(self, key):
+        start, end = self._lookup(key)
+        return self._decode(self._data[start:end])
+
+    def __iter__(self):
+        for raw_key in self._index:
+            yield self._decode(raw_key)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, dict(self))
+
+
 @overload
-def rules(address: tuple[str, int], timeout: float, encoding: str) -> dict[str, str]:
+def rules(address: tuple[str, int], timeout: float, encoding: str, lazy: Literal[False] = False) -> dict[str, str]:
     ...
 
 @overload
-def rules(address: tuple[str, int], timeout: float, encoding: None) -> dict[bytes, bytes]:
+def rules(address: tuple[str, int], timeout: float, encoding: None, lazy: Literal[False] = False) -> dict[bytes, bytes]:
+    ...
+
+@overload
+def rules(address: tuple[str, int], timeout: float, encoding: Union[str, None], lazy: Literal[True]) -> LazyRules:
     ...
 
 def rules(
     address: tuple[str, int],
     timeout: float = DEFAULT_TIMEOUT,
-    encoding: Union[str, None] = DEFAULT_ENCODING
-) -> Union[dict[str, str], dict[bytes, bytes]]:
-    return request_sync(address, timeout, encoding, RulesProtocol)
+    encoding: Union[str, None] = DEFAULT_ENCODING,
+    lazy: bool = False
+) -> Union[dict[str, str], dict[bytes, bytes], LazyRules]:
+    return request_sync(address, timeout, encoding, RulesProtocol(lazy))
 
 @overload
-async def arules(address: tuple[str, int], timeout: float, encoding: str) -> dict[str, str]:
+async def arules(address: tuple[str, int], timeout: float, encoding: str, lazy: Literal[False] = False) -> dict[str, str]:
     ...
 
 @overload
-async def arules(address: tuple[str, int], timeout: float, encoding: None) -> dict[bytes, bytes]:
+async def arules(address: tuple[str, int], timeout: float, encoding: None, lazy: Literal[False] = False) -> dict[bytes, bytes]:
+    ...
+
+@overload
+async def arules(address: tuple[str, int], timeout: float, encoding: Union[str, None], lazy: Literal[True]) -> LazyRules:
     ...
 
 async def arules(
+    address: tuple[str, int],
+    timeout: float = DEFAULT_TIMEOUT,
+    encoding: Union[str, None] = DEFAULT_ENCODING,
+    lazy: bool = False
+) -> Union[dict[str, str], dict[bytes, bytes], LazyRules]:
+    return await request_async(address, timeout, encoding, RulesProtocol(lazy))
+
+def arules_iter(
     address: tuple[str, int],
     timeout: float = DEFAULT_TIMEOUT,
     encoding: Union[str, None] = DEFAULT_ENCODING
-) -> Union[dict[str, str], dict[bytes, bytes]]:
-    return await request_async(address, timeout, encoding, RulesProtocol)
+) -> Union[AsyncIterator[tuple[str, str]], AsyncIterator[tuple[bytes, bytes]]]:
+    """Yields (key, value) pairs while the response is still arriving"""
+    return request_async_iter(address, timeout, encoding, RulesProtocol)
 
 
 class RulesProtocol:
+    def __init__(self, lazy=False):
+        self.lazy = lazy
+
     @staticmethod
     def validate_response_type(response_type):
         return response_type == A2S_RULES_RESPONSE
@@ -51,12 +128,23 @@ class RulesProtocol:
     def serialize_request(challenge):
         return b"\x56" + challenge.to_bytes(4, "little")
 
-    @staticmethod
-    def deserialize_response(reader, response_type, ping):
-        rule_count = reader.read_int16()
-        # Have to use tuples to preserve evaluation order
+    def deserialize_response(self, reader, response_type, ping):
+        rule_count = self.deserialize_count(reader)
+        if self.lazy:
+            data = reader.read()
+            with stage("build_result"):
+                return LazyRules(data, rule_count, reader.encoding)
         resp = dict(
-            (reader.read_cstring(), reader.read_cstring())
+            self.deserialize_entry(reader)
             for rule_num in range(rule_count)
         )
         return resp
+
+    @staticmethod
+    def deserialize_count(reader):
+        return reader.read_int16()
+
+    @staticmethod
+    def deserialize_entry(reader):
+        # Have to use tuples to preserve evaluation order
+        return (reader.read_cstring(), reader.read_cstring())
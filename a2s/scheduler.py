@@ -0,0 +1,263 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Iterable, Union
+
+from a2s.defaults import (
+    DEFAULT_TIMEOUT, DEFAULT_ENCODING, DEFAULT_CONCURRENCY)
+from a2s.a2s_async import A2SSharedSocket, request_shared
+from a2s.info import InfoProtocol
+from a2s.players import PlayersProtocol
+from a2s.rules import RulesProtocol
+
+
+
+logger = logging.getLogger("a2s")
+
+QUERY_PROTOCOLS = {
+    "info": InfoProtocol(),
+    "players": PlayersProtocol,
+    "rules": RulesProtocol(),
+}
+
+
+@dataclass(eq=False)
+class ScheduleEntry:
+    address: tuple[str, int]
+    """Address of the server"""
+
+    queries: tuple[str, ...]
+    """Query types to run: info, players or rules"""
+
+    interval: float
+    """Seconds between two runs"""
+
+    priority: int = 0
+    """Entries with a higher priority are sent first when several are due"""
+
+    due: float = 0.0
+    """Monotonic time of the next run"""
+
+    cancelled: bool = False
+    """Entry was removed and won't be scheduled again"""
+
+@dataclass
+class ScheduleResult:
+    address: tuple[str, int]
+    """Address of the server"""
+
+    query: str
+    """Query type that produced the result"""
+
+    result: Any
+    """Return value of the query, None if it failed"""
+
+    error: Optional[Exception]
+    """Exception raised by the query, None if it succeeded"""
+
+
+class A2SScheduler:
+    """Runs queries periodically. Entries are kept in a heap ordered by their
+    due time and spread out with random jitter, so the number of tasks stays
+    at max_concurrency no matter how many servers are scheduled. Results are
+    passed to callback or, if none is given, can be read by iterating over the
+    scheduler with async for."""
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[ScheduleResult], Any]] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        encoding: Union[str, None] = DEFAULT_ENCODING,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        max_rate: Optional[float] = None,
+        max_destination_rate: Optional[float] = None,
+        jitter: float = 0.1,
+        shared: Optional[A2SSharedSocket] = None
+    ):
+        self.callback = callback
+        self.timeout = timeout
+        self.encoding = encoding
+        self.max_concurrency = max_concurrency
+        self.max_rate = max_rate
+        self.max_destination_rate = max_destination_rate
+        self.jitter = jitter
+        self.shared = shared
+        self._heap = []
+        self._sequence = itertools.count()
+        self._destinations = collections.Counter()
+        self._next_query = {}
+        self._tasks = set()
+        self._results = None
+        self._wakeup = None
+        self._stopped = False
+
+    def add(
+        self,
+        address: tuple[str, int],
+        queries: Iterable[str] = ("info",),
+        interval: float = 60.0,
+        priority: int = 0
+    ) -> ScheduleEntry:
+        queries = tuple(queries)
+        for query in queries:
+            if query not in QUERY_PROTOCOLS:
+                raise ValueError("Unknown query type: " + repr(query))
+        if interval <= 0:
+            raise ValueError("Interval must be positive")
+
+        # Start at a random point of the first interval to avoid bursts
+        entry = ScheduleEntry(
+            address, queries, interval, priority,
+            due=time.monotonic() + random.uniform(0, interval))
+        self._destinations[address] += 1
+        self._push(entry)
+        return entry
+
+    def remove(self, entry: ScheduleEntry):
+        if entry.cancelled:
+            return
+        # The heap item is skipped when it comes up
+        entry.cancelled = True
+        self._destinations[entry.address] -= 1
+        if self._destinations[entry.address] <= 0:
+            del self._destinations[entry.address]
+            self._next_query.pop(entry.address, None)
+
+    def __len__(self):
+        return sum(self._destinations.values())
+
+    async def run(self):
+        self._stopped = False
+        self._wakeup = asyncio.Event()
+        results = self._get_results()
+        slots = asyncio.Semaphore(self.max_concurrency)
+        own_shared = self.shared is None
+        if own_shared:
+            self.shared = await A2SSharedSocket.create(max_rate=self.max_rate)
+        elif self.max_rate is not None:
+            self.shared.pacer.limit(self.max_rate)
+
+        ready = []
+        try:
+            while not self._stopped:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    due, seq, entry = heapq.heappop(self._heap)
+                    if not entry.cancelled:
+                        heapq.heappush(ready, (-entry.priority, due, seq, entry))
+
+                if ready:
+                    await slots.acquire()
+                    entry = heapq.heappop(ready)[3]
+                    if entry.cancelled:
+                        slots.release()
+                        continue
+                    task = asyncio.create_task(self._run_entry(entry, slots))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                    continue
+
+                delay = self._heap[0][0] - now if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._stopped = True
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            # Entries that were due but not sent yet run first next time
+            for neg_priority, due, seq, entry in ready:
+                heapq.heappush(self._heap, (due, seq, entry))
+            if own_shared:
+                self.shared.close()
+                self.shared = None
+            if not results.full():
+                results.put_nowait(None)
+
+    def stop(self):
+        self._stopped = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> ScheduleResult:
+        results = self._get_results()
+        if self._stopped and results.empty():
+            raise StopAsyncIteration
+        result = await results.get()
+        if result is None:
+            raise StopAsyncIteration
+        return result
+
+    def _get_results(self):
+        # Created on first use so it belongs to the running loop
+        if self._results is None:
+            self._results = asyncio.Queue(maxsize=self.max_concurrency)
+        return self._results
+
+    def _push(self, entry):
+        heapq.heappush(self._heap, (entry.due, next(self._sequence), entry))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_entry(self, entry, slots):
+        try:
+            for query in entry.queries:
+                if entry.cancelled:
+                    break
+                await self._wait_destination(entry.address)
+                try:
+                    result = await request_shared(
+                        self.shared, entry.address, self.timeout, self.encoding,
+                        QUERY_PROTOCOLS[query])
+                    error = None
+                except Exception as exc:
+                    # Reported instead of ending the task, the other queries
+                    # of the entry still run
+                    result = None
+                    error = exc
+                await self._deliver(
+                    ScheduleResult(entry.address, query, result, error))
+        finally:
+            slots.release()
+            if not entry.cancelled:
+                self._reschedule(entry)
+
+    def _reschedule(self, entry):
+        # Based on the previous due time so the cadence doesn't drift
+        entry.due += entry.interval * (
+            1 + random.uniform(-self.jitter, self.jitter))
+        now = time.monotonic()
+        if entry.due < now:
+            # Skip runs that were missed because of a backlog
+            entry.due = now + random.uniform(0, entry.interval * self.jitter)
+        self._push(entry)
+
+    async def _wait_destination(self, address):
+        if self.max_destination_rate is None:
+            return
+        now = time.monotonic()
+        send_time = max(now, self._next_query.get(address, now))
+        if address in self._destinations:
+            self._next_query[address] = send_time + 1 / self.max_destination_rate
+        if send_time > now:
+            await asyncio.sleep(send_time - now)
+
+    async def _deliver(self, result):
+        if self.callback is not None:
+            try:
+                self.callback(result)
+            except Exception:
+                logger.exception("Scheduler callback raised an exception")
+        else:
+            await self._get_results().put(result)
@@ -0,0 +1,545 @@
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional, Iterable, Iterator, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from a2s.info import SourceInfo, GoldSrcInfo
+
+
+
+# A store is a directory with three append-only files:
+# records.dat - Header and fixed width records, readers only look at the
+#               first `count` records, which is updated after they're written
+# strings.dat - Interned strings, records reference them by offset
+# index.dat   - Open addressing hash table from address to the newest record,
+#               each record links to the previous one of the same address
+RECORDS_FILE = "records.dat"
+STRINGS_FILE = "strings.dat"
+INDEX_FILE = "index.dat"
+LOCK_FILE = "writer.lock"
+
+RECORDS_MAGIC = b"A2SREC\x00\x01"
+STRINGS_MAGIC = b"A2SSTR\x00\x01"
+INDEX_MAGIC = b"A2SIDX\x00\x01"
+
+# magic, record size, reserved, committed record count
+RECORDS_HEADER = struct.Struct("<8sIIQ")
+RECORDS_COUNT_OFFSET = 16
+# magic, capacity, reserved, number of records already in the index
+INDEX_HEADER = struct.Struct("<8sIIQ")
+INDEX_COUNT_OFFSET = 16
+# address hash, host string, port, newest record + 1
+INDEX_SLOT = struct.Struct("<IIHQ")
+STRING_LENGTH = struct.Struct("<I")
+
+INITIAL_INDEX_CAPACITY = 1024
+
+KIND_SOURCE = 0
+KIND_GOLDSRC = 1
+
+FLAG_PASSWORD_PROTECTED = 0x01
+FLAG_VAC_ENABLED = 0x02
+FLAG_IS_MOD = 0x04
+FLAG_MULTIPLAYER_ONLY = 0x08
+FLAG_USES_CUSTOM_DLL = 0x10
+FLAG_HAS_MOD_INFO = 0x20
+FLAG_HAS_DLL_INFO = 0x40
+FLAG_BYTES = 0x80
+
+STRING_FIELDS = (
+    "server_name", "map_name", "folder", "game", "server_type", "platform",
+    "version", "stv_name", "keywords", "address", "mod_website", "mod_download"
+)
+
+RECORD = struct.Struct(
+    "<dIHBQ"  # timestamp, host string, port, kind, previous record + 1
+    "BHBBBHB" # protocol, app_id, player_count, max_players, bot_count, flags, edf
+    "HQHQIId" # port, steam_id, stv_port, game_id, mod_version, mod_size, ping
+    + "I" * len(STRING_FIELDS))
+RECORD_TIMESTAMP = struct.Struct("<d")
+
+
+@dataclass
+class StoredResult:
+    timestamp: float
+    """Unix time the result was stored at"""
+
+    address: tuple[str, int]
+    """Address of the server"""
+
+    info: Union[SourceInfo, GoldSrcInfo]
+    """Stored info response"""
+
+
+def address_hash(host, port):
+    return zlib.crc32(host + port.to_bytes(2, "little"))
+
+def open_store_file(path, header):
+    try:
+        return open(path, "r+b")
+    except FileNotFoundError:
+        pass
+    with open(path, "xb") as store_file:
+        store_file.write(header)
+    return open(path, "r+b")
+
+
+class A2SStoreWriter:
+    """Appends info results to a store. Only one writer can have a store
+    open at a time, any number of A2SStoreReader can read it concurrently."""
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock_file = open(os.path.join(path, LOCK_FILE), "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                raise RuntimeError("Store is already open for writing: " + path)
+
+        self._records = open_store_file(
+            os.path.join(path, RECORDS_FILE),
+            RECORDS_HEADER.pack(RECORDS_MAGIC, RECORD.size, 0, 0))
+        magic, record_size, reserved, self._count = RECORDS_HEADER.unpack(
+            self._records.read(RECORDS_HEADER.size))
+        if magic != RECORDS_MAGIC or record_size != RECORD.size:
+            raise ValueError("Not a compatible result store: " + path)
+        # Drop records of a writer that crashed before committing them
+        self._records.truncate(RECORDS_HEADER.size + self._count * RECORD.size)
+
+        self._last_timestamp = -math.inf
+        if self._count:
+            self._records.seek(-RECORD.size, os.SEEK_END)
+            self._last_timestamp = RECORD_TIMESTAMP.unpack(
+                self._records.read(RECORD_TIMESTAMP.size))[0]
+
+        self._strings = open_store_file(
+            os.path.join(path, STRINGS_FILE), STRINGS_MAGIC)
+        self._interned = {}
+        self._load_strings()
+
+        self._heads = {}
+        self._open_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self._count
+
+    def append(
+        self,
+        address: tuple[str, int],
+        info: Union[SourceInfo, GoldSrcInfo],
+        timestamp: Optional[float] = None
+    ):
+        self.extend([(address, info, timestamp)])
+
+    def extend(self, results: Iterable[tuple]):
+        """Appends (address, info, timestamp) tuples and commits them at once,
+        timestamp can be None for the current time"""
+        records = bytearray()
+        heads = {}
+        count = self._count
+        for address, info, timestamp in results:
+            if timestamp is None:
+                timestamp = time.time()
+            # Lookups by time rely on records being sorted
+            timestamp = max(timestamp, self._last_timestamp)
+            self._last_timestamp = timestamp
+
+            host, port = address
+            host = host.encode("utf-8")
+            key = (self._intern(host), port)
+            if key in heads:
+                previous = heads[key][1]
+            else:
+                previous = self._heads.get(key, (None, 0, None))[1]
+            records += self._pack_record(timestamp, key, previous, info)
+            count += 1
+            heads[key] = (address_hash(host, port), count)
+        if not heads:
+            return
+
+        # Strings have to be visible before the records referencing them
+        self._strings.flush()
+        self._records.seek(0, os.SEEK_END)
+        self._records.write(records)
+        self._records.flush()
+        self._records.seek(RECORDS_COUNT_OFFSET)
+        self._records.write(count.to_bytes(8, "little"))
+        self._records.flush()
+        self._count = count
+
+        for key, (key_hash, head) in heads.items():
+            self._set_head(key, key_hash, head)
+        self._index[INDEX_COUNT_OFFSET:INDEX_COUNT_OFFSET + 8] = (
+            count.to_bytes(8, "little"))
+
+    def close(self):
+        if self._lock_file.closed:
+            return
+        self._index.close()
+        self._records.close()
+        self._strings.close()
+        self._lock_file.close()
+
+    def _load_strings(self):
+        data = self._strings.read()
+        offset = len(STRINGS_MAGIC)
+        while offset + STRING_LENGTH.size <= len(data):
+            length = STRING_LENGTH.unpack_from(data, offset)[0]
+            end = offset + STRING_LENGTH.size + length
+            if end > len(data):
+                break
+            self._interned[data[offset + STRING_LENGTH.size:end]] = offset
+            offset = end
+        # Cut off a partially written string
+        self._strings.truncate(offset)
+        self._strings.seek(offset)
+        self._strings_end = offset
+
+    def _intern(self, value):
+        if value is None:
+            return 0
+        offset = self._interned.get(value)
+        if offset is None:
+            offset = self._strings_end
+            self._strings.write(STRING_LENGTH.pack(len(value)) + value)
+            self._strings_end += STRING_LENGTH.size + len(value)
+            self._interned[value] = offset
+        return offset
+
+    def _pack_record(self, timestamp, key, previous, info):
+        strings = [getattr(info, name, None) for name in STRING_FIELDS]
+        flags = 0
+        if any(isinstance(value, bytes) for value in strings):
+            flags |= FLAG_BYTES
+        string_ids = [
+            self._intern(value.encode("utf-8") if isinstance(value, str) else value)
+            for value in strings
+        ]
+        if info.password_protected:
+            flags |= FLAG_PASSWORD_PROTECTED
+        if info.vac_enabled:
+            flags |= FLAG_VAC_ENABLED
+        ping = math.nan if info.ping is None else info.ping
+
+        if isinstance(info, SourceInfo):
+            return RECORD.pack(
+                timestamp, key[0], key[1], KIND_SOURCE, previous,
+                info.protocol, info.app_id, info.player_count, info.max_players,
+                info.bot_count, flags, info.edf, info.port or 0,
+                info.steam_id or 0, info.stv_port or 0, info.game_id or 0, 0, 0,
+                ping, *string_ids)
+
+        if info.is_mod:
+            flags |= FLAG_IS_MOD
+        if info.mod_version is not None:
+            flags |= FLAG_HAS_MOD_INFO
+        if info.multiplayer_only:
+            flags |= FLAG_MULTIPLAYER_ONLY
+        if info.uses_custom_dll is not None:
+            flags |= FLAG_HAS_DLL_INFO
+        if info.uses_custom_dll:
+            flags |= FLAG_USES_CUSTOM_DLL
+        return RECORD.pack(
+            timestamp, key[0], key[1], KIND_GOLDSRC, previous,
+            info.protocol, 0, info.player_count, info.max_players,
+            info.bot_count, flags, 0, 0, 0, 0, 0, info.mod_version or 0,
+            info.mod_size or 0, ping, *string_ids)
+
+    def _open_index(self):
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open_store_file(index_path, INDEX_HEADER.pack(
+                INDEX_MAGIC, INITIAL_INDEX_CAPACITY, 0, 0)) as index_file:
+            magic, capacity, reserved, indexed = INDEX_HEADER.unpack(
+                index_file.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC:
+                raise ValueError("Not a compatible result store: " + self.path)
+            index_file.truncate(INDEX_HEADER.size + capacity * INDEX_SLOT.size)
+            self._index = mmap.mmap(index_file.fileno(), 0)
+        self._capacity = capacity
+
+        for slot in range(capacity):
+            key_hash, host_id, port, head = INDEX_SLOT.unpack_from(
+                self._index, INDEX_HEADER.size + slot * INDEX_SLOT.size)
+            if host_id:
+                self._heads[(host_id, port)] = (slot, head, key_hash)
+
+        # Catch up on records committed after the index was last updated
+        if indexed < self._count:
+            heads = {}
+            for number in range(indexed, self._count):
+                self._records.seek(RECORDS_HEADER.size + number * RECORD.size)
+                record = RECORD.unpack(self._records.read(RECORD.size))
+                heads[(record[1], record[2])] = number + 1
+            hosts = {offset: value for value, offset in self._interned.items()}
+            for (host_id, port), head in heads.items():
+                key_hash = address_hash(hosts[host_id], port)
+                self._set_head((host_id, port), key_hash, head)
+            self._index[INDEX_COUNT_OFFSET:INDEX_COUNT_OFFSET + 8] = (
+                self._count.to_bytes(8, "little"))
+
+    def _set_head(self, key, key_hash, head):
+        if key in self._heads:
+            slot = self._heads[key][0]
+        else:
+            if (len(self._heads) + 1) * 2 > self._capacity:
+                self._grow_index()
+            slot = self._find_free_slot(key_hash)
+        self._heads[key] = (slot, head, key_hash)
+        INDEX_SLOT.pack_into(
+            self._index, INDEX_HEADER.size + slot * INDEX_SLOT.size,
+            key_hash, key[0], key[1], head)
+
+    def _find_free_slot(self, key_hash):
+        mask = self._capacity - 1
+        slot = key_hash & mask
+        while INDEX_SLOT.unpack_from(
+                self._index, INDEX_HEADER.size + slot * INDEX_SLOT.size)[1]:
+            slot = (slot + 1) & mask
+        return slot
+
+    def _grow_index(self):
+        # Readers still holding the old file keep a consistent, older view
+        capacity = self._capacity * 2
+        index_path = os.path.join(self.path, INDEX_FILE)
+        new_path = index_path + ".new"
+        with open(new_path, "wb") as index_file:
+            index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, capacity, 0, 0))
+            index_file.truncate(INDEX_HEADER.size + capacity * INDEX_SLOT.size)
+        with open(new_path, "r+b") as index_file:
+            index = mmap.mmap(index_file.fileno(), 0)
+        index[INDEX_COUNT_OFFSET:INDEX_COUNT_OFFSET + 8] = (
+            self._index[INDEX_COUNT_OFFSET:INDEX_COUNT_OFFSET + 8])
+        self._index.close()
+        self._index = index
+        self._capacity = capacity
+        heads = self._heads
+        self._heads = {}
+        for key, (slot, head, key_hash) in heads.items():
+            slot = self._find_free_slot(key_hash)
+            self._heads[key] = (slot, head, key_hash)
+            INDEX_SLOT.pack_into(
+                self._index, INDEX_HEADER.size + slot * INDEX_SLOT.size,
+                key_hash, key[0], key[1], head)
+        self._index.flush()
+        os.replace(new_path, index_path)
+
+
+class A2SStoreReader:
+    """Reads a store through mmap. Safe to use while a writer is appending,
+    new records show up as soon as they are committed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records_file = open(os.path.join(path, RECORDS_FILE), "rb")
+        self._strings_file = open(os.path.join(path, STRINGS_FILE), "rb")
+        self._records = mmap.mmap(
+            self._records_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, record_size, reserved, count = RECORDS_HEADER.unpack_from(
+            self._records)
+        if magic != RECORDS_MAGIC or record_size != RECORD.size:
+            raise ValueError("Not a compatible result store: " + path)
+        self._strings = mmap.mmap(
+            self._strings_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index_file = None
+        self._index = None
+        self._open_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self._committed()
+
+    def __getitem__(self, number: int) -> StoredResult:
+        count = self._committed()
+        if number < 0:
+            number += count
+        if not 0 <= number < count:
+            raise IndexError("Record number out of range")
+        return self._build_result(self._unpack_record(number))
+
+    def history(self, address: tuple[str, int]) -> Iterator[StoredResult]:
+        """Results for address, newest first"""
+        host, port = address
+        host = host.encode("utf-8")
+        head = self._find_head(host, port)
+        # The writer updates the index after the count, so reading the count
+        # afterwards maps every record the head can point to
+        self._committed()
+        while head:
+            record = self._unpack_record(head - 1)
+            yield self._build_result(record)
+            head = record[4]
+
+    def latest(self, address: tuple[str, int]) -> Optional[StoredResult]:
+        return next(self.history(address), None)
+
+    def between(self, start: float, end: float) -> Iterator[StoredResult]:
+        """Results with start <= timestamp < end, oldest first"""
+        count = self._committed()
+        number = self._bisect(start, count)
+        while number < count:
+            if self._timestamp(number) >= end:
+                break
+            yield self._build_result(self._unpack_record(number))
+            number += 1
+
+    def close(self):
+        if self._records_file.closed:
+            return
+        self._records.close()
+        self._strings.close()
+        self._index.close()
+        self._records_file.close()
+        self._strings_file.close()
+        self._index_file.close()
+
+    def _committed(self):
+        count = int.from_bytes(
+            self._records[RECORDS_COUNT_OFFSET:RECORDS_COUNT_OFFSET + 8], "little")
+        if self._record_offset(count) > len(self._records):
+            self._records.close()
+            self._records = mmap.mmap(
+                self._records_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return count
+
+    def _record_offset(self, number):
+        return RECORDS_HEADER.size + number * RECORD.size
+
+    def _timestamp(self, number):
+        return RECORD_TIMESTAMP.unpack_from(
+            self._records, self._record_offset(number))[0]
+
+    def _bisect(self, timestamp, count):
+        low = 0
+        high = count
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _open_index(self):
+        index_path = os.path.join(self.path, INDEX_FILE)
+        index_file = open(index_path, "rb")
+        if self._index is not None:
+            self._index.close()
+            self._index_file.close()
+        self._index_file = index_file
+        self._index_inode = os.fstat(index_file.fileno()).st_ino
+        self._index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._capacity, reserved, indexed = INDEX_HEADER.unpack_from(
+            self._index)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a compatible result store: " + self.path)
+
+    def _find_head(self, host, port):
+        # The writer replaces the file when the table grows
+        if os.stat(os.path.join(self.path, INDEX_FILE)).st_ino != self._index_inode:
+            self._open_index()
+        key_hash = address_hash(host, port)
+        mask = self._capacity - 1
+        slot = key_hash & mask
+        while True:
+            slot_hash, host_id, slot_port, head = INDEX_SLOT.unpack_from(
+                self._index, INDEX_HEADER.size + slot * INDEX_SLOT.size)
+            if not host_id:
+                return 0
+            if (slot_hash == key_hash and slot_port == port
+                    and self._read_string(host_id) == host):
+                return head
+            slot = (slot + 1) & mask
+
+    def _read_string(self, offset):
+        if not offset:
+            return None
+        if offset + STRING_LENGTH.size > len(self._strings):
+            self._remap_strings()
+        length = STRING_LENGTH.unpack_from(self._strings, offset)[0]
+        start = offset + STRING_LENGTH.size
+        if start + length > len(self._strings):
+            self._remap_strings()
+        return self._strings[start:start + length]
+
+    def _remap_strings(self):
+        self._strings.close()
+        self._strings = mmap.mmap(
+            self._strings_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _unpack_record(self, number):
+        return RECORD.unpack_from(self._records, self._record_offset(number))
+
+    def _build_result(self, record):
+        (timestamp, host_id, port, kind, previous, protocol, app_id,
+            player_count, max_players, bot_count, flags, edf, game_port,
+            steam_id, stv_port, game_id, mod_version, mod_size, ping) = record[:19]
+        strings = {}
+        for name, offset in zip(STRING_FIELDS, record[19:]):
+            value = self._read_string(offset)
+            if value is not None and not flags & FLAG_BYTES:
+                value = value.decode("utf-8")
+            strings[name] = value
+        if math.isnan(ping):
+            ping = None
+        password_protected = bool(flags & FLAG_PASSWORD_PROTECTED)
+        vac_enabled = bool(flags & FLAG_VAC_ENABLED)
+
+        if kind == KIND_SOURCE:
+            info = SourceInfo(
+                protocol, strings["server_name"], strings["map_name"],
+                strings["folder"], strings["game"], app_id, player_count,
+                max_players, bot_count, strings["server_type"],
+                strings["platform"], password_protected, vac_enabled,
+                strings["version"], edf, ping)
+            if info.has_port:
+                info.port = game_port
+            if info.has_steam_id:
+                info.steam_id = steam_id
+            if info.has_stv:
+                info.stv_port = stv_port
+                info.stv_name = strings["stv_name"]
+            if info.has_keywords:
+                info.keywords = strings["keywords"]
+            if info.has_game_id:
+                info.game_id = game_id
+        else:
+            has_mod_info = bool(flags & FLAG_HAS_MOD_INFO)
+            has_dll_info = bool(flags & FLAG_HAS_DLL_INFO)
+            info = GoldSrcInfo(
+                strings["address"], strings["server_name"], strings["map_name"],
+                strings["folder"], strings["game"], player_count, max_players,
+                protocol, strings["server_type"], strings["platform"],
+                password_protected, bool(flags & FLAG_IS_MOD), vac_enabled,
+                bot_count, ping, strings["mod_website"], strings["mod_download"],
+                mod_version if has_mod_info else None,
+                mod_size if has_mod_info else None,
+                bool(flags & FLAG_MULTIPLAYER_ONLY) if has_mod_info else None,
+                bool(flags & FLAG_USES_CUSTOM_DLL) if has_dll_info else None)
+
+        address = (self._read_string(host_id).decode("utf-8"), port)
+        return StoredResult(timestamp, address, info)
@@ -15,6 +15,9 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/Yepoleb/python-a2s",
     packages=["a2s"],
+    entry_points={
+        "console_scripts": ["a2s = a2s.cli:main"]
+    },
     license="MIT License",
     classifiers=[
         "Development Status :: 4 - Beta",